@@ -0,0 +1,104 @@
+""" Counts the solutions of every puzzle in a file to check that it is well-posed.
+
+    python audit.py sudokus.txt --workers 8
+    python audit.py hard.txt --limit 0 --split-depth 3
+
+Counting stops at --limit solutions, the default 2 is enough to tell a
+unique puzzle from one with several solutions, 0 counts all of them.
+The puzzles are spread over the processes in chunks like in batch.py.
+With --split-depth the search tree of each puzzle is split instead: the
+cells the search would branch on first are filled in every possible
+way and each of the resulting boards is counted in its own process,
+which helps with a few puzzles that have a huge number of solutions.
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+
+import batch
+import puzzles
+import solver
+
+
+def countChunk(limit, chunk):
+    return [solver.Solver().countSolutions(sudoku, limit) for sudoku in chunk]
+
+
+def subproblems(sudoku, depth):
+    """ Yields the boards the search has after depth more branches, one per branch.
+    Each time the cell with the fewest candidates is filled, like the solvers do. """
+    if depth == 0:
+        yield sudoku
+        return
+    candidates = solver.initialCandidates(sudoku)
+    free = [(len(cell), y, x) for y, row in enumerate(candidates) for x, cell in enumerate(row) if cell is not None]
+    if not free:
+        yield sudoku
+        return
+    count, y, x = min(free)
+    for num in candidates[y][x]:
+        board = [row[:] for row in sudoku]
+        board[y][x] = num
+        yield from subproblems(board, depth - 1)
+
+
+def countSplit(sudoku, limit=2, depth=2, executor=None):
+    """ Counts the solutions of one puzzle with its search tree split at depth over
+    the processes of executor, stops as soon as limit solutions were found """
+    total = 0
+    pending = {executor.submit(countChunk, limit, [board]) for board in subproblems(sudoku, depth)}
+    try:
+        while pending and not (limit and total >= limit):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            total += sum(future.result()[0] for future in done)
+    finally:
+        for future in pending:
+            future.cancel()
+    return min(total, limit) if limit else total
+
+
+def countAll(sudokus, limit=2, workers=None, chunkSize=256, depth=None):
+    """ Yields the number of solutions of every sudoku in input order, at most limit """
+    if depth is None:
+        yield from batch.mapChunks(partial(countChunk, limit), sudokus, workers, chunkSize)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        for sudoku in sudokus:
+            yield countSplit(sudoku, limit, depth, executor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that every puzzle of a file has exactly one solution")
+    parser.add_argument("file", nargs="?", default="sudokus.txt")
+    parser.add_argument("--size", type=int, default=9, help="board size, 9, 16 or 25")
+    parser.add_argument("--limit", type=int, default=2, help="stop counting at this many solutions, 0 for all")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, all cores by default")
+    parser.add_argument("--chunk-size", type=int, default=256, help="puzzles sent to a worker at once")
+    parser.add_argument("--split-depth", type=int, default=None,
+                        help="split the search tree of each puzzle at this depth instead of spreading the puzzles")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = {"unique": 0, "none": 0, "multiple": 0}
+    sudokus = puzzles.iterSudokus(args.file, args.size)
+    for k, count in enumerate(countAll(sudokus, args.limit, args.workers, args.chunk_size, args.split_depth)):
+        if count == 1:
+            counts["unique"] += 1
+            continue
+        if count == 0:
+            counts["none"] += 1
+            print("puzzle %d: no solution" % k)
+        else:
+            counts["multiple"] += 1
+            print("puzzle %d: %d%s solutions" % (k, count, " or more" if count == args.limit else ""))
+    print("%d unique, %d without solution, %d with several in %.3fs" % (
+        counts["unique"], counts["none"], counts["multiple"], time.perf_counter() - start
+    ), file=sys.stderr)
+    if counts["none"] or counts["multiple"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
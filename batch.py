@@ -0,0 +1,104 @@
+""" Solves a whole puzzle file on all cores and streams the results in input order.
+
+    python batch.py sudokus.txt --method DLX --workers 8 --chunk-size 256 --output solutions.txt
+
+Every output line is the solution as 81 characters (or "none") followed by
+the solve time in seconds.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+import cache
+import puzzles
+import solver
+
+
+def solveChunk(method, chunk, cacheFile=None):
+    results = []
+    if cacheFile:
+        solutions = cache.SolutionCache(cacheFile)
+    for sudoku in chunk:
+        if cacheFile:
+            start = time.perf_counter()
+            res, stats = solutions.solve(sudoku, method)
+            results.append((res, time.perf_counter() - start, stats is None))
+        else:
+            res, stats = solver.solve(sudoku, method)
+            results.append((res, stats.time, False))
+    if cacheFile:
+        solutions.close()
+    return results
+
+
+def chunks(sudokus, chunkSize):
+    sudokus = iter(sudokus)
+    chunk = list(islice(sudokus, chunkSize))
+    while chunk:
+        yield chunk
+        chunk = list(islice(sudokus, chunkSize))
+
+
+def mapChunks(function, items, workers=None, chunkSize=256):
+    """ Yields the results of function(chunk), a list per chunk, item by item in input order.
+
+    Only a few chunks per worker are in flight at a time, so the input
+    can be a lazy iterator over a file of any size. Chunks that have not
+    started yet are dropped when the generator is closed early.
+    """
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(workers) as executor:
+        try:
+            pending = deque()
+            for chunk in chunks(items, chunkSize):
+                pending.append(executor.submit(function, chunk))
+                if len(pending) >= 2*workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+def solveAll(sudokus, method="DLX", workers=None, chunkSize=256, cacheFile=None):
+    """ Yields (solution, seconds, cached) for every sudoku in input order """
+    return mapChunks(partial(solveChunk, method, cacheFile=cacheFile), sudokus, workers, chunkSize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve a puzzle file using all cores")
+    parser.add_argument("file", nargs="?", default="sudokus.txt")
+    parser.add_argument("--method", choices=solver.Solver.methods, default="DLX")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, all cores by default")
+    parser.add_argument("--chunk-size", type=int, default=256, help="puzzles sent to a worker at once")
+    parser.add_argument("--output", default=None, help="file to write to instead of stdout")
+    parser.add_argument("--cache", default=None, help="solution cache file to look up and fill")
+    parser.add_argument("--size", type=int, default=9, help="board size, 9, 16 or 25")
+    args = parser.parse_args()
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    count = solved = hits = 0
+    start = time.perf_counter()
+    try:
+        results = solveAll(puzzles.iterSudokus(args.file, args.size), args.method, args.workers, args.chunk_size, args.cache)
+        for res, seconds, cached in results:
+            out.write("%s %.6f\n" % (puzzles.formatSudoku(res) if res else "none", seconds))
+            count += 1
+            solved += bool(res)
+            hits += cached
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print("solved %d/%d in %.3fs (%.0f puzzles/s)" % (solved, count, elapsed, count/elapsed if elapsed else 0), file=sys.stderr)
+    if args.cache:
+        print("cache hits %d, misses %d" % (hits, count - hits), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
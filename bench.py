@@ -0,0 +1,143 @@
+""" Benchmarks the solver methods on a puzzle file and compares them with a stored baseline.
+
+    python bench.py sudokus.txt --repeats 5 --warmup 1
+    python bench.py sudokus.txt --save
+
+Every puzzle is solved repeats times per method after warmup passes that
+are not counted, its time is the median of the repeats. The report shows
+the median and 99th percentile over the puzzles, the total node count and
+the largest peak allocation of a single solve, which is measured in an
+extra pass because tracemalloc slows the search down.
+
+Without --save the results are compared with the baseline file, a method
+whose median or total time got slower by more than the threshold is a
+regression and makes the exit status 1 (p99 is too noisy for that).
+Changed node counts mean the search order changed. Times only compare
+well with a baseline from the same machine.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import statistics
+import sys
+import tracemalloc
+
+import puzzles
+import solver
+
+
+def percentile(values, p):
+    """ Nearest rank percentile, p in 0..100 """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p/100*len(ordered)) - 1, 0)]
+
+
+def measure(sudokus, method, repeats=5, warmup=1):
+    """ Returns the results of one method as a dict """
+    for _ in range(warmup):
+        for sudoku in sudokus:
+            solver.solve(sudoku, method)
+    times = []
+    nodes = 0
+    solved = 0
+    enabled = gc.isenabled()
+    try:
+        for sudoku in sudokus:
+            runs = []
+            for _ in range(repeats):
+                gc.collect()
+                gc.disable()
+                res, stats = solver.solve(sudoku, method)
+                gc.enable()
+                runs.append(stats.time)
+            times.append(statistics.median(runs))
+            nodes += stats.nodes
+            solved += bool(res)
+    finally:
+        if enabled:
+            gc.enable()
+        else:
+            gc.disable()
+    tracemalloc.start()
+    try:
+        peakMemory = max(solver.solve(sudoku, method)[1].peakMemory for sudoku in sudokus)
+    finally:
+        tracemalloc.stop()
+    return {
+        "solved": solved,
+        "median": statistics.median(times),
+        "p99": percentile(times, 99),
+        "total": sum(times),
+        "nodes": nodes,
+        "peakMemory": peakMemory
+    }
+
+
+def compareBaseline(results, baseline, threshold):
+    """ Prints how the results differ from the baseline, returns the regressed methods """
+    regressions = []
+    for method, result in results.items():
+        old = baseline.get(method)
+        if old is None:
+            print("%-14s not in the baseline" % method)
+            continue
+        slower = [
+            "%s %+.0f%%" % (key, 100*(result[key]/old[key] - 1))
+            for key in ("median", "total")
+            if old[key] and result[key] > old[key]*(1 + threshold)
+        ]
+        if slower:
+            regressions.append(method)
+            print("%-14s REGRESSION %s" % (method, ", ".join(slower)))
+        else:
+            print("%-14s ok, median %+.0f%%" % (method, 100*(result["median"]/old["median"] - 1) if old["median"] else 0))
+        if result["nodes"] != old["nodes"]:
+            print("%-14s nodes changed from %d to %d, the search order is different" % (method, old["nodes"], result["nodes"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the solver methods against a stored baseline")
+    parser.add_argument("file", nargs="?", default="sudokus.txt")
+    parser.add_argument("--size", type=int, default=9, help="board size, 9, 16 or 25")
+    parser.add_argument("--methods", nargs="+", choices=solver.Solver.methods, default=solver.Solver.methods)
+    parser.add_argument("--limit", type=int, default=None, help="only the first puzzles of the file")
+    parser.add_argument("--repeats", type=int, default=5, help="timed solves per puzzle")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed passes over the puzzles first")
+    parser.add_argument("--baseline", default="baseline.json", help="file with the stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 is 20%%")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    sudokus = puzzles.loadSudokus(args.file, args.size)[:args.limit]
+    results = {}
+    print("%-14s %7s %10s %10s %10s %12s %12s" % ("method", "solved", "median ms", "p99 ms", "total s", "nodes", "peak KB"))
+    for method in args.methods:
+        result = results[method] = measure(sudokus, method, args.repeats, args.warmup)
+        print("%-14s %7d %10.3f %10.3f %10.3f %12d %12.1f" % (
+            method, result["solved"], 1000*result["median"], 1000*result["p99"], result["total"],
+            result["nodes"], result["peakMemory"]/1024
+        ))
+
+    key = "%s:%d:%s" % (os.path.basename(args.file), len(sudokus), args.size)
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+    if args.save:
+        stored.setdefault(key, {}).update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("baseline saved to %s" % args.baseline)
+    elif key in stored:
+        if compareBaseline(results, stored[key], args.threshold):
+            sys.exit(1)
+    else:
+        print("no baseline for %s in %s, store one with --save" % (key, args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+""" Persistent LRU cache of solutions, shared by all equivalent puzzles.
+
+Two puzzles are equivalent if one turns into the other by relabelling
+the numbers, permuting rows inside a band, permuting bands, doing the
+same for columns and stacks, or transposing. canonical() finds the
+smallest such form, which is used as the key, and the solution is
+stored in canonical coordinates. Boards other than 9x9 are only
+shared with exactly the same puzzle. On very sparse boards only the
+first MAX_STATES tied forms are followed, so some equivalent puzzles
+get different keys there, which only costs cache hits.
+"""
+import sqlite3
+from itertools import permutations, product
+
+import puzzles
+import solver
+
+PERMS3 = list(permutations(range(3)))
+# every column order that keeps the stacks together
+COLUMN_ORDERS = [
+    tuple(3*stack + inner[s][k] for s, stack in enumerate(stacks) for k in range(3))
+    for stacks in PERMS3
+    for inner in product(PERMS3, repeat=3)
+]
+# filled-cell mask of a row -> (smallest permuted mask, the column orders giving it)
+SMALLEST = {}
+# tied partial forms followed at most, sparse boards tie in millions of ways
+MAX_STATES = 2000
+
+
+def smallestMask(mask):
+    if mask not in SMALLEST:
+        best = None
+        orders = []
+        for cols in COLUMN_ORDERS:
+            permuted = tuple(mask[c] for c in cols)
+            if best is None or permuted < best:
+                best = permuted
+                orders = []
+            if permuted == best:
+                orders.append(cols)
+        SMALLEST[mask] = best, orders
+    return SMALLEST[mask]
+
+
+def rowPattern(row, cols, labels, nextLabel):
+    """ The row in column order with numbers relabelled by first occurrence """
+    pattern = []
+    new = {}
+    for c in cols:
+        num = row[c]
+        if num:
+            label = labels[num] or new.get(num)
+            if not label:
+                label = new[num] = nextLabel
+                nextLabel += 1
+            pattern.append(label)
+        else:
+            pattern.append(0)
+    return pattern, new, nextLabel
+
+
+def canonical(sudoku):
+    """ Returns (key, transform), the key is the smallest equivalent puzzle as 81
+    characters, transform = (transposed, rows, cols, labels) maps the puzzle onto it """
+    n = len(sudoku)
+    if n != 9:
+        return "%d:%s" % (n, puzzles.formatSudoku(sudoku)), (0, range(n), range(n), list(range(n + 1)))
+    grids = (sudoku, [list(col) for col in zip(*sudoku)])
+    # the first row only depends on which cells are filled,
+    # its numbers always become 1, 2, 3, ... in order
+    best = None
+    first = []
+    for t, grid in enumerate(grids):
+        for r in range(9):
+            mask, orders = smallestMask(tuple(1 if num else 0 for num in grid[r]))
+            if best is None or mask < best:
+                best = mask
+                first = []
+            if mask == best:
+                first.extend((t, r, cols) for cols in orders)
+    states = []
+    for t, r, cols in first[:MAX_STATES]:
+        pattern, new, nextLabel = rowPattern(grids[t][r], cols, [0]*10, 1)
+        states.append((t, (r,), cols, labelList(new), nextLabel))
+    key = [pattern]
+    for k in range(1, 9):
+        best = None
+        newStates = []
+        seen = set()
+        for t, rows, cols, labels, nextLabel in states:
+            if k % 3 == 0:
+                usedBands = {r//3 for r in rows}
+                candidates = [r for r in range(9) if r//3 not in usedBands]
+            else:
+                band = rows[-1]//3
+                candidates = [r for r in range(3*band, 3*band + 3) if r not in rows]
+            for r in candidates:
+                pattern, new, label = rowPattern(grids[t][r], cols, labels, nextLabel)
+                if best is None or pattern < best:
+                    best = pattern
+                    newStates = []
+                    seen = set()
+                if pattern == best and len(newStates) < MAX_STATES:
+                    newLabels = labels[:]
+                    for num, l in new.items():
+                        newLabels[num] = l
+                    # the same rows in another order continue exactly the same way
+                    state = (t, frozenset(rows + (r,)), r//3, cols, tuple(newLabels))
+                    if state not in seen:
+                        seen.add(state)
+                        newStates.append((t, rows + (r,), cols, newLabels, label))
+        key.append(best)
+        states = newStates
+    t, rows, cols, labels, nextLabel = states[0]
+    # numbers that are not given get the remaining labels
+    for num in range(1, 10):
+        if not labels[num]:
+            labels[num] = nextLabel
+            nextLabel += 1
+    return "".join(str(num) for row in key for num in row), (t, rows, cols, labels)
+
+
+def labelList(new):
+    labels = [0]*10
+    for num, label in new.items():
+        labels[num] = label
+    return labels
+
+
+def toCanonical(sudoku, transform):
+    t, rows, cols, labels = transform
+    grid = [list(col) for col in zip(*sudoku)] if t else sudoku
+    return [[labels[grid[r][c]] if grid[r][c] else 0 for c in cols] for r in rows]
+
+
+def fromCanonical(sudoku, transform):
+    t, rows, cols, labels = transform
+    n = len(sudoku)
+    inverse = [0]*(n + 1)
+    for num in range(1, n + 1):
+        inverse[labels[num]] = num
+    grid = [[0]*n for _ in range(n)]
+    for i, r in enumerate(rows):
+        for j, c in enumerate(cols):
+            grid[r][c] = inverse[sudoku[i][j]]
+    return [list(col) for col in zip(*grid)] if t else grid
+
+
+class SolutionCache():
+    """ Solutions in an sqlite file, the least recently used are dropped beyond capacity """
+    def __init__(self, filename="solutions.db", capacity=100000):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        # counters and use times not written yet, see flush()
+        self.pending = {"hits": 0, "misses": 0}
+        self.used = {}
+        self.db = sqlite3.connect(filename, timeout=30)
+        self.db.execute("CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, solution TEXT, used INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS solutionsUsed ON solutions (used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS statistics (name TEXT PRIMARY KEY, value INTEGER)")
+        self.clock = self.db.execute("SELECT COALESCE(MAX(used), 0) FROM solutions").fetchone()[0]
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    def get(self, sudoku):
+        """ The cached solution or None """
+        key, transform = canonical(sudoku)
+        row = self.db.execute("SELECT solution FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            self.pending["misses"] += 1
+            return None
+        self.hits += 1
+        self.pending["hits"] += 1
+        self.used[key] = self.tick()
+        n = len(sudoku)
+        values = puzzles.symbols(n)
+        solution = [[values[char] for char in row[0][n*k:n*(k + 1)]] for k in range(n)]
+        return fromCanonical(solution, transform)
+
+    def put(self, sudoku, solution):
+        key, transform = canonical(sudoku)
+        solution = puzzles.formatSudoku(toCanonical(solution, transform))
+        # the use times decide what is dropped
+        self.flush()
+        self.db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)", (key, solution, self.tick()))
+        size = self.db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+        if size > self.capacity:
+            self.db.execute(
+                "DELETE FROM solutions WHERE key IN (SELECT key FROM solutions ORDER BY used LIMIT ?)",
+                (size - self.capacity,)
+            )
+        self.db.commit()
+
+    def solve(self, sudoku, method="DLX"):
+        """ Like solver.solve, stats is None if the solution came from the cache """
+        solution = self.get(sudoku)
+        if solution:
+            return solution, None
+        solution, stats = solver.solve(sudoku, method)
+        if solution:
+            self.put(sudoku, solution)
+        return solution, stats
+
+    def flush(self):
+        """ Writes the counters and use times of the lookups since the last flush in one transaction.
+        A lookup writes nothing itself, an open write would lock out the other workers. """
+        for name, value in self.pending.items():
+            if value:
+                self.db.execute("INSERT OR IGNORE INTO statistics VALUES (?, 0)", (name,))
+                self.db.execute("UPDATE statistics SET value = value + ? WHERE name = ?", (value, name))
+        self.db.executemany("UPDATE solutions SET used = ? WHERE key = ?", [(used, key) for key, used in self.used.items()])
+        self.db.commit()
+        self.pending = dict.fromkeys(self.pending, 0)
+        self.used = {}
+
+    def statistics(self):
+        """ Hits and misses of this session and of all time """
+        total = dict(self.db.execute("SELECT name, value FROM statistics"))
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "totalHits": total.get("hits", 0) + self.pending["hits"],
+            "totalMisses": total.get("misses", 0) + self.pending["misses"],
+            "size": self.db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+        }
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -0,0 +1,102 @@
+""" Renders the solve animation without a display.
+
+    python export.py --method Dynamic --puzzle 3 --png frames/
+    python export.py --method Backtracking --video solve.mp4 --steps-per-frame 64
+
+The normal drawing code of main.Game runs against SDL's dummy video
+driver. Frames in which no cell changed are dropped, so the length of
+the result only depends on the number of steps. --video pipes raw
+frames into ffmpeg, which picks the format from the file name
+(.mp4, .webm, .gif, ...).
+"""
+import argparse
+import os
+import subprocess
+import sys
+from itertools import islice
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+import main
+import puzzles
+import solver
+
+
+def frames(game, stepsPerFrame):
+    """ Plays the whole trace and yields after every frame that changed """
+    game.stepsPerFrame = stepsPerFrame
+    game.seek(0)
+    game.setup()
+    yield
+    while game.position < len(game.trace):
+        game.advance()
+        if game.setup():
+            yield
+
+
+def export(sudoku, method, size=(1280, 720), stepsPerFrame=1, png=None, video=None, fps=30, hold=2, sudokuFile="sudokus.txt"):
+    """ Writes the animation as numbered PNG files into png and/or into the video file,
+    hold is how many seconds the solution stays at the end of the video.
+    Returns the number of frames. """
+    # no solution cache and no JSON line, only the frames are written
+    game = main.Game(sudokuFile, len(sudoku), cacheFile=None, quiet=True)
+    game.onResize(size)
+    # onResize keeps the old size for frames narrower than 4:3
+    size = game.screen.get_size()
+    game.initial = sudoku
+    game.setMethod(game.methods.index(method))
+    game.solve(method)
+    game.finishSolve()
+    encoder = None
+    if video:
+        encoder = subprocess.Popen([
+            "ffmpeg", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", "%dx%d" % size, "-r", str(fps), "-i", "-",
+            "-pix_fmt", "yuv420p" if not video.endswith(".gif") else "rgb24", video
+        ], stdin=subprocess.PIPE)
+    if png:
+        os.makedirs(png, exist_ok=True)
+    count = 0
+    try:
+        for _ in frames(game, stepsPerFrame):
+            if png:
+                pygame.image.save(game.screen, os.path.join(png, "frame%06d.png" % count))
+            if encoder:
+                encoder.stdin.write(pygame.image.tostring(game.screen, "RGB"))
+            count += 1
+        if encoder:
+            last = pygame.image.tostring(game.screen, "RGB")
+            for _ in range(hold*fps):
+                encoder.stdin.write(last)
+    finally:
+        if encoder:
+            encoder.stdin.close()
+            encoder.wait()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a solve animation without a display")
+    parser.add_argument("--file", default="sudokus.txt", help="puzzle file")
+    parser.add_argument("--puzzle", type=int, default=0, help="index of the puzzle in the file")
+    parser.add_argument("--method", choices=solver.Solver.methods, default="Backtracking")
+    parser.add_argument("--size", default="1280x720", help="frame size, at least 4:3 wide")
+    parser.add_argument("--steps-per-frame", type=float, default=1)
+    parser.add_argument("--png", default=None, help="directory for a PNG sequence")
+    parser.add_argument("--video", default=None, help="video or GIF file, needs ffmpeg")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--board-size", type=int, default=9, help="9, 16 or 25")
+    args = parser.parse_args()
+    if not args.png and not args.video:
+        parser.error("give --png and/or --video")
+
+    sudoku = next(islice(puzzles.iterSudokus(args.file, args.board_size), args.puzzle, None), None)
+    if sudoku is None:
+        sys.exit("%s has no puzzle %d" % (args.file, args.puzzle))
+    size = tuple(int(part) for part in args.size.split("x"))
+    if size[0]*9 < size[1]*12:
+        parser.error("--size %s is narrower than 4:3" % args.size)
+    count = export(sudoku, args.method, size, args.steps_per_frame, args.png, args.video, args.fps, sudokuFile=args.file)
+    print("%d frames written" % count)
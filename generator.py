@@ -0,0 +1,173 @@
+""" Generates new puzzles with a unique solution and grades how hard they are.
+
+    python generator.py 10000 --output generated.txt --workers 8
+    python generator.py 500 --grade expert --symmetric
+
+A random full grid is made by filling the boxes on the diagonal at random,
+letting DLX complete it and shuffling rows, columns and numbers. Then the
+givens are taken out in random order, each one only if the solver finds
+no other solution with a different number in that cell. A check that
+needs more than --budget search nodes keeps the given, which hardly
+matters for 9x9 but keeps 16x16 boards from taking minutes.
+
+The grade is the first level whose propagation rules solve the puzzle
+without guessing: easy needs hidden singles, medium also naked singles,
+hard also locked candidates, and expert needs the search. Every puzzle is
+written as one line, followed by its grade and the nodes and backtracks
+of the Propagation solver, which puzzles.py ignores when reading.
+"""
+import argparse
+import os
+import sys
+import time
+from functools import partial
+from math import isqrt
+from random import Random
+
+import batch
+import propagation
+import puzzles
+import solver
+
+# grade -> rules that solve every puzzle of it without guessing
+LEVELS = [
+    ("easy", ["hiddenSingles"]),
+    ("medium", ["nakedSingles", "hiddenSingles"]),
+    ("hard", list(propagation.RULES))
+]
+GRADES = [name for name, rules in LEVELS] + ["expert"]
+
+
+def fullGrid(rng, size=9):
+    """ A random solved board """
+    boxSize = isqrt(size)
+    board = [[0]*size for _ in range(size)]
+    # the boxes on the diagonal do not see each other
+    for b in range(boxSize):
+        nums = rng.sample(range(1, size + 1), size)
+        for k, num in enumerate(nums):
+            board[b*boxSize + k//boxSize][b*boxSize + k%boxSize] = num
+    board = solver.solve(board, "DLX")[0]
+
+    def order():
+        bands = rng.sample(range(boxSize), boxSize)
+        return [boxSize*band + r for band in bands for r in rng.sample(range(boxSize), boxSize)]
+
+    labels = [0] + rng.sample(range(1, size + 1), size)
+    rows, cols = order(), order()
+    board = [[labels[board[r][c]] for c in cols] for r in rows]
+    if rng.random() < 0.5:
+        board = [list(col) for col in zip(*board)]
+    return board
+
+
+def dig(board, rng, symmetric=False, budget=None):
+    """ Takes givens out of the solved board as long as the solution stays unique.
+    A given whose check needs more than budget search nodes stays. """
+    n = len(board)
+    puzzle = [row[:] for row in board]
+    # locked candidates cost more than the few guesses they save here
+    check = solver.Solver(rules=["nakedSingles", "hiddenSingles"])
+    check.budget = budget
+    cells = [(y, x) for y in range(n) for x in range(n)]
+    rng.shuffle(cells)
+    for y, x in cells:
+        if not puzzle[y][x]:
+            continue
+        group = {(y, x), (n - 1 - y, n - 1 - x)} if symmetric else {(y, x)}
+        for i, j in group:
+            puzzle[i][j] = 0
+        # another solution would differ from board in one of the removed cells
+        try:
+            unique = not any(check.solveWithout(puzzle, i, j, board[i][j]) for i, j in group)
+        except solver.SearchAborted:
+            unique = False
+        if not unique:
+            for i, j in group:
+                puzzle[i][j] = board[i][j]
+    return puzzle
+
+
+def grade(sudoku):
+    """ Returns (grade, stats of the Propagation solver with all rules) """
+    for name, rules in LEVELS:
+        res, stats = solver.Solver(rules=rules).solve(sudoku, "Propagation")
+        if stats.nodes == 1:
+            if rules != LEVELS[-1][1]:
+                # the stats written out are always those with all rules
+                res, stats = solver.Solver(rules=LEVELS[-1][1]).solve(sudoku, "Propagation")
+            return name, stats
+    return "expert", stats
+
+
+def generate(seed, size=9, symmetric=False, budget=30):
+    """ Returns (puzzle, grade, stats), the same seed gives the same puzzle """
+    rng = Random(seed)
+    sudoku = dig(fullGrid(rng, size), rng, symmetric, budget)
+    name, stats = grade(sudoku)
+    return sudoku, name, stats
+
+
+def generateChunk(size, symmetric, budget, wanted, seeds):
+    """ The lines of all puzzles of the seeds, None for those without a wanted grade """
+    lines = []
+    for seed in seeds:
+        sudoku, name, stats = generate(seed, size, symmetric, budget)
+        if wanted and name not in wanted:
+            lines.append(None)
+        else:
+            lines.append("%s %s %d %d" % (puzzles.formatSudoku(sudoku), name, stats.nodes, stats.backtracks))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate graded puzzles with a unique solution on all cores")
+    parser.add_argument("count", type=int, help="number of puzzles to write, at least 1")
+    parser.add_argument("--size", type=int, default=9, help="board size, 9, 16 or 25")
+    parser.add_argument("--grade", nargs="+", choices=GRADES, default=None, help="only keep these grades")
+    parser.add_argument("--symmetric", action="store_true", help="givens point symmetric to the center")
+    parser.add_argument("--budget", type=int, default=30,
+                        help="search nodes allowed to prove that a given can go, more gives fewer givens but takes longer")
+    parser.add_argument("--seed", type=int, default=None, help="first seed, random by default")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, all cores by default")
+    parser.add_argument("--chunk-size", type=int, default=64, help="puzzles generated by a worker at once")
+    parser.add_argument("--output", default=None, help="file to write to instead of stdout")
+    args = parser.parse_args()
+    if args.count < 1:
+        parser.error("count must be at least 1")
+
+    workers = args.workers or os.cpu_count()
+    # a few puzzles should not wait for full chunks on every worker
+    chunkSize = max(1, min(args.chunk_size, -(-args.count//workers)))
+    seed = Random().randrange(2**32) if args.seed is None else args.seed
+    # with a grade filter not every seed gives a puzzle, so the seeds never run out
+    seeds = iter(range(seed, sys.maxsize))
+    work = partial(generateChunk, args.size, args.symmetric, args.budget, args.grade)
+    out = open(args.output, "w") if args.output else sys.stdout
+    count = tried = 0
+    grades = dict.fromkeys(GRADES, 0)
+    start = time.perf_counter()
+    try:
+        results = batch.mapChunks(work, seeds, workers, chunkSize)
+        for line in results:
+            tried += 1
+            if line is None:
+                continue
+            out.write(line + "\n")
+            grades[line.split()[1]] += 1
+            count += 1
+            if count == args.count:
+                break
+        results.close()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print("%d puzzles of %d tried in %.3fs (%.0f per minute), seeds from %d: %s" % (
+        count, tried, elapsed, 60*count/elapsed if elapsed else 0, seed,
+        ", ".join("%s %d" % item for item in grades.items())
+    ), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,26 @@
+import json
 import pygame
 import sys
-from copy import deepcopy
-from random import randrange
 import time
+import tracemalloc
+from math import isqrt
+import puzzles
+import solver
+import worker
+
+# the font that comes with pygame, looking up a system font by name scans all installed fonts first
+FONT_FILE = None
 
 class Game():
-    def __init__(self):
-        pygame.init()
-        self.methods = [
-            "Backtracking",
-            "Dynamic"
-        ]
+    def __init__(self, sudokuFile="sudokus.txt", size=9, cacheFile="solutions.db", quiet=False):
+        # only what the window needs, the other modules (sound, joystick) take long to start
+        pygame.display.init()
+        pygame.font.init()
+        # size x size cells in boxes of boxSize x boxSize
+        self.size = size
+        self.boxSize = isqrt(size)
+        self.symbolValues = puzzles.symbols(size)
+        self.methods = list(solver.Solver.methods)
         self.texts = [
             """   Backtracking with Brute Force
             
@@ -48,25 +58,66 @@ class Game():
             Since the order in which the fields are filled is not fixed, 
             the current state must be saved at each step 
             to be able to reproduce it later. 
+            On 16×16 boards and larger it guesses far too often, 
+            so constraint propagation is selected there. 
+            The animation is deliberately slowed down.
+            """
+            ,
+            """
+            Backtracking with bitmasks
+
+            The same dynamic order as method 2, 
+            but the used numbers of every row, column and box 
+            are stored as bits of a single integer. 
+            The candidates of a field are then just the free bits 
+            of its row, column and box combined. 
+            Placing a number sets three bits and taking it back 
+            clears them again, so nothing has to be copied 
+            and the state does not need to be saved at each step. 
+            Like method 2 it is too slow for 16×16 boards and larger. 
+            The animation is deliberately slowed down.
+            """
+            ,
+            """
+            Dancing Links (Algorithm X)
+
+            A Sudoku is an exact cover problem: 
+            every field, every number in a row, 
+            every number in a column and every number in a box 
+            has to be covered exactly once. 
+            Knuth's Algorithm X always picks the constraint 
+            with the fewest possibilities left and tries them in turn. 
+            The matrix is stored as circular linked lists, 
+            so removing and restoring a possibility only relinks nodes. 
+            Instead of recursion the chosen rows are kept on a stack. 
+            The animation is deliberately slowed down.
+            """
+            ,
+            """
+            Constraint propagation
+
+            Before every guess, logical rules are applied 
+            until none of them finds anything new: 
+            a field with only one candidate gets it (naked single), 
+            a number that fits in only one field of a row, 
+            column or box goes there (hidden single), 
+            and a number confined to one line inside a box 
+            is removed from the rest of that line (locked candidates). 
+            Only then the field with the fewest candidates is guessed. 
+            Most Sudokus are solved by logic alone, 
+            so there is hardly any backtracking left. 
             The animation is deliberately slowed down.
             """
         ]
-        self.methodIndex = 1
+        # without propagation the larger boards take minutes
+        self.methodIndex = self.methods.index("Dynamic" if size <= 9 else "Propagation")
         self.method = self.methods[self.methodIndex]
-        self.board = [
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0]
-        ]
-        self.loadSudokus()
-        self.indexSudokus = randrange(len(self.sudokus))
-        self.initial = deepcopy(self.sudokus[self.indexSudokus])
+        self.board = [[0]*self.size for _ in range(self.size)]
+        # a text file or a packed library written by store.py
+        self.sudokuFile = sudokuFile
+        self.initial = puzzles.randomSudoku(self.sudokuFile, self.size)
+        # the solution cache is opened by the worker of each solve, None for no cache
+        self.cacheFile = cacheFile
         screenInfo = pygame.display.Info()
         self.width = screenInfo.current_w
         self.height = screenInfo.current_h
@@ -78,10 +129,10 @@ class Game():
         self.padding1 = smallest//30
         self.padding2 = smallest//30
         self.boardSize = self.height-2*self.padding1
-        self.third = self.boardSize//3
-        self.cellLength = (self.boardSize-6*self.padding2)//9
+        self.boxLength = self.boardSize//self.boxSize
+        self.cellLength = (self.boardSize-2*self.boxSize*self.padding2)//self.size
         self.lineThicknessFactor = 80
-        self.lineThickness = max((self.boardSize - 6*self.padding2)//(3*self.lineThicknessFactor), 1)
+        self.lineThickness = max((self.boardSize - 2*self.boxSize*self.padding2)//(self.boxSize*self.lineThicknessFactor), 1)
         self.fact1 = self.padding1 + self.padding2 + self.lineThickness
         buttonAreaWidth = self.width - self.height
         self.buttSolve = pygame.Rect(
@@ -96,10 +147,11 @@ class Game():
             buttonAreaWidth//4,
             self.height//12
         )
-        self.button1 = pygame.Rect(0, 0, self.height//12, self.height//12)
-        self.button2 = pygame.Rect(0, 0, self.height//12, self.height//12)
-        self.font = pygame.font.SysFont("Helvetica", self.height//18)
-        self.fontSmall = pygame.font.SysFont("Helvetica", self.height//40)
+        self.methodButtons = [pygame.Rect(0, 0, self.height//12, self.height//12) for _ in self.methods]
+        # fonts per height, text is rendered once per (text, font, color) when first drawn
+        self.fonts = {}
+        self.textCache = {}
+        self.setFonts()
         self.colorBackground = 33, 33, 33
         self.colorLines = 191, 191, 191
         self.colorSelected = 77, 77, 77
@@ -107,20 +159,42 @@ class Game():
         self.colorFontDark = self.colorBackground
         self.colorInitial = 59, 59, 59
         self.colorButton = 232, 135, 245
-        self.numsRendered = {i: self.font.render(str(i), True, self.colorFont) for i in range(1, 10)}
-        self.loadSudokus()
+        # retained drawing: cached static layers and what each cell shows on screen
+        self.gridLayer = None
+        self.panelLayer = None
+        self.drawn = {}
+        # playback of the recorded search
+        self.clock = pygame.time.Clock()
+        self.fps = 60
+        self.trace = None
+        # the search running in the background, it fills the trace
+        self.worker = None
+        self.position = 0
+        self.paused = False
+        self.stepsPerFrame = 1
+        self.stepBudget = 0
+        # statistics of the last solve, shown on the overlay and printed as a JSON line
+        self.stats = None
+        self.timing = None
+        # cache statistics of the last solve for the JSON line
+        self.cacheResult = None
+        # what the last search failed with, shown in the caption
+        self.error = None
+        self.reported = True
+        # quiet=True prints no JSON lines
+        self.quiet = quiet
+        self.overlay = False
+        self.overlayDrawn = None
 
     def onResize(self, size):
         a, b = size
         # proportion of 12:9 or wider
         if a*9 >= b*12:
-            pygame.display.set_mode(size, pygame.RESIZABLE)
+            self.screen = pygame.display.set_mode(size, pygame.RESIZABLE)
             self.width, self.height = size
             self.padding1 = self.height//30
             self.padding2 = self.height//40
-            self.font = pygame.font.SysFont("Helvetica", self.height//18)
-            self.fontSmall = pygame.font.SysFont("Helvetica", self.height//40)
-            self.numsRendered = {i: self.font.render(str(i), True, self.colorFont) for i in range(1, 10)}
+            self.setFonts()
             buttonAreaWidth = self.width - self.height
             self.buttSolve = pygame.Rect(
                 0,
@@ -134,207 +208,314 @@ class Game():
                 buttonAreaWidth//4,
                 self.height//12
             )
-            self.button1 = pygame.Rect(0, 0, self.height//12, self.height//12)
-            self.button2 = pygame.Rect(0, 0, self.height//12, self.height//12)
+            self.methodButtons = [pygame.Rect(0, 0, self.height//12, self.height//12) for _ in self.methods]
             self.boardSize = self.height-2*self.padding1
-            self.third = self.boardSize//3
-            self.cellLength = (self.boardSize-6*self.padding2)//9
-            self.lineThickness = max((self.boardSize - 6*self.padding2)//(3*self.lineThicknessFactor), 1)
+            self.boxLength = self.boardSize//self.boxSize
+            self.cellLength = (self.boardSize-2*self.boxSize*self.padding2)//self.size
+            self.lineThickness = max((self.boardSize - 2*self.boxSize*self.padding2)//(self.boxSize*self.lineThicknessFactor), 1)
             self.fact1 = self.padding1 + self.padding2 + self.lineThickness
+            self.invalidate()
             self.setup()
 
-    """ Draws grid from point p1 left-top to p2 bottom-right on screen """
-    def drawGrid(self, p1, p2):
+    """ Fonts for the current window height, the cached text is dropped when their sizes change """
+    def setFonts(self):
+        heights = self.height//18, self.height//40, self.height//(2*self.size)
+        if set(heights) != set(self.fonts):
+            self.fonts = {height: pygame.font.Font(FONT_FILE, height) for height in heights}
+            self.textCache = {}
+        self.font, self.fontSmall, self.fontCell = (self.fonts[height] for height in heights)
+
+    """ The text rendered with one of the fonts, kept until the fonts change """
+    def renderText(self, text, font, color):
+        key = text, font, color
+        surface = self.textCache.get(key)
+        if surface is None:
+            surface = self.textCache[key] = font.render(text, True, color)
+        return surface
+
+    """ Draws grid from point p1 left-top to p2 bottom-right on surface """
+    def drawGrid(self, surface, p1, p2):
         width = p2[0] - p1[0]
         height = p2[1] - p1[1]
-        for i in range(2):
+        for i in range(self.boxSize - 1):
             pygame.draw.line(
-                self.screen,
+                surface,
                 self.colorLines,
-                (width*(i+1)/3 + p1[0], p1[1]),
-                (width*(i+1)/3 + p1[0], p2[1]),
+                (width*(i+1)/self.boxSize + p1[0], p1[1]),
+                (width*(i+1)/self.boxSize + p1[0], p2[1]),
                 max(width//self.lineThicknessFactor, 1) # linesize
             )
             pygame.draw.line(
-                self.screen,
+                surface,
                 self.colorLines,
-                (p1[0], height*(i+1)/3 + p1[1]),
-                (p2[0], height*(i+1)/3 + p1[1]),
+                (p1[0], height*(i+1)/self.boxSize + p1[1]),
+                (p2[0], height*(i+1)/self.boxSize + p1[1]),
                 max(width//self.lineThicknessFactor, 1) # linesize
             )
 
-    def setup(self):
-        pygame.init()
-        self.screen.fill(self.colorBackground)
+    """ Background and all lines of the board, without any numbers.
+    The lines are also kept on their own transparent layer to draw over a selected cell """
+    def renderGridLayer(self):
         padding1 = self.padding1
         padding2 = self.padding2
-        cellLength = self.cellLength
-
-        self.lineThickness = max((self.boardSize - 6*padding2)//(3*self.lineThicknessFactor), 1)
-        # draw currently selected
-        if self.currentlySelected:
-            bigPos = self.currentlySelected[0]//3, self.currentlySelected[1]//3
-            smallPos = self.currentlySelected[0]%3, self.currentlySelected[1]%3
-            
-            self.currentRect = pygame.Rect(
-                padding1 + bigPos[0]*self.boardSize//3 + smallPos[0]*cellLength + padding2 + self.lineThickness,
-                padding1 + bigPos[1]*self.boardSize//3 + smallPos[1]*cellLength + padding2 + self.lineThickness,
-                cellLength - self.lineThickness,
-                cellLength - self.lineThickness
-            )
-            pygame.draw.rect(
-                self.screen,
-                self.colorSelected, 
-                self.currentRect
-            )
+        self.linesLayer = pygame.Surface((self.height, self.height))
+        self.linesLayer.fill(self.colorBackground)
+        self.linesLayer.set_colorkey(self.colorBackground)
         # draw thick lines
         topLeft = (padding1, padding1)
         bottomright = (padding1+self.boardSize, padding1+self.boardSize)
         self.drawGrid(
+            self.linesLayer,
             topLeft,
             bottomright
         )
         # draw thin lines
-        for i in range(3):
-            for j in range(3):
-                topLeft2 = (padding1 + self.boardSize*i//3 + padding2, padding1 + self.boardSize*j//3 + padding2)
-                bottomright2 = (padding1 + self.boardSize*(i+1)//3 - padding2, padding1 + self.boardSize*(j+1)//3 - padding2)
+        boxSize = self.boxSize
+        for i in range(boxSize):
+            for j in range(boxSize):
+                topLeft2 = (padding1 + self.boardSize*i//boxSize + padding2, padding1 + self.boardSize*j//boxSize + padding2)
+                bottomright2 = (padding1 + self.boardSize*(i+1)//boxSize - padding2, padding1 + self.boardSize*(j+1)//boxSize - padding2)
                 self.drawGrid(
+                    self.linesLayer,
                     topLeft2,
                     bottomright2
                 )
-        # draw nums
-        for i in range(3):
-            for j in range(3):
-                topLeft = (
-                    padding1 + j * self.boardSize//3,
-                    padding1 + i * self.boardSize//3
-                )
-                for k in range(3):
-                    for l in range(3):
-                        if self.board[i*3+k][j*3+l]:
-                            topLeft2 = (
-                                topLeft[0] + l * cellLength + padding2,
-                                topLeft[1] + k * cellLength + padding2
-                            )
-                            txt = self.numsRendered[self.board[i*3+k][j*3+l]]
-                            txtRect = txt.get_rect(center = (topLeft2[0] + cellLength//2, topLeft2[1] + cellLength//2))
-                        elif self.initial[i*3+k][j*3+l]:
-                            topLeft2 = (
-                                topLeft[0] + l * cellLength + padding2 + self.lineThickness,
-                                topLeft[1] + k * cellLength + padding2 + self.lineThickness
-                            )
-                            pygame.draw.rect(
-                                self.screen,
-                                self.colorInitial,
-                                (
-                                    topLeft2[0],
-                                    topLeft2[1],
-                                    cellLength - self.lineThickness,
-                                    cellLength - self.lineThickness
-                                )
-                            )
-                            txt = self.numsRendered[self.initial[i*3+k][j*3+l]]
-                            txtRect = txt.get_rect(center = (topLeft2[0] + cellLength//2, topLeft2[1] + cellLength//2))
-                        else:
-                            continue
-                        self.screen.blit(txt, txtRect)
+        layer = pygame.Surface((self.height, self.height))
+        layer.fill(self.colorBackground)
+        layer.blit(self.linesLayer, (0, 0))
+        return layer
+
+    """ Description and buttons right of the board, the button rects are in screen coordinates """
+    def renderPanelLayer(self):
+        padding1 = self.padding1
+        padding2 = self.padding2
+        left = self.height
+        layer = pygame.Surface((max(self.width - left, 1), self.height))
+        layer.fill(self.colorBackground)
+
+        def blitCentered(surface, center):
+            layer.blit(surface, surface.get_rect(center = (center[0] - left, center[1])))
 
         buttonAreaWidth = self.width - self.height
         for i, line in enumerate(self.texts[self.methodIndex].split("\n")):
-            movesurface = self.fontSmall.render(line, True, self.colorFont)
-            textRect = movesurface.get_rect(center = (self.height + buttonAreaWidth//2, self.height*(i+1)//30))
-            self.screen.blit(movesurface, textRect)
-
-        self.buttSolve.center = (self.boardSize + 2*padding1 + buttonAreaWidth*2//3, self.height*9//12)
-        pygame.draw.rect(self.screen, self.colorButton, self.buttSolve)
-        movesurface = self.font.render("Solve", True, self.colorFontDark)
-        textRect = movesurface.get_rect(center = self.buttSolve.center)
-        self.screen.blit(movesurface, textRect)
-
-        self.buttNext.center = (self.boardSize + 2*padding1 + buttonAreaWidth//3, self.height*9//12)
-        pygame.draw.rect(self.screen, self.colorButton, self.buttNext)
-        movesurface = self.font.render("Next", True, self.colorFontDark)
-        textRect = movesurface.get_rect(center = self.buttNext.center)
-        self.screen.blit(movesurface, textRect)
-
-        movesurface = self.font.render("Method:", True, self.colorFont)
-        textRect = movesurface.get_rect(center = (self.boardSize + 2*padding1 + buttonAreaWidth//3, self.height*11//12))
-        self.screen.blit(movesurface, textRect)
-
-        #self.button1.center = (self.boardSize + 2*padding1 + buttonAreaWidth*2//3, self.height*11//12)
-        self.button1.right = self.boardSize + 2*padding1 + buttonAreaWidth*2//3 - padding2
-        self.button1.centery = self.height*11//12
-        color = self.colorButton if self.methodIndex == 0 else self.colorInitial
-        pygame.draw.rect(self.screen, color, self.button1)
-        movesurface = self.font.render("1", True, self.colorFontDark)
-        textRect = movesurface.get_rect(center = self.button1.center)
-        self.screen.blit(movesurface, textRect)
-        #self.button2.center = (self.boardSize + 2*padding1 + buttonAreaWidth*5//6, self.height*11//12)
-        self.button2.left = self.boardSize + 2*padding1 + buttonAreaWidth*2//3 + padding2
-        self.button2.centery = self.height*11//12
-        color = self.colorButton if self.methodIndex == 1 else self.colorInitial
-        pygame.draw.rect(self.screen, color, self.button2)
-        movesurface = self.font.render("2", True, self.colorFontDark)
-        textRect = movesurface.get_rect(center = self.button2.center)
-        self.screen.blit(movesurface, textRect)
-        pygame.display.update()
+            movesurface = self.renderText(line, self.fontSmall, self.colorFont)
+            blitCentered(movesurface, (self.height + buttonAreaWidth//2, self.height*(i+1)//30))
+
+        for button, text, centerX in (
+            (self.buttSolve, "Solve", self.boardSize + 2*padding1 + buttonAreaWidth*2//3),
+            (self.buttNext, "Next", self.boardSize + 2*padding1 + buttonAreaWidth//3)
+        ):
+            button.center = (centerX, self.height*9//12)
+            pygame.draw.rect(layer, self.colorButton, button.move(-left, 0))
+            blitCentered(self.renderText(text, self.font, self.colorFontDark), button.center)
+
+        movesurface = self.renderText("Method:", self.font, self.colorFont)
+        blitCentered(movesurface, (self.height + buttonAreaWidth//2, self.height*10//12))
+
+        # method buttons in one row, smaller if they do not fit
+        gap = padding2//2
+        count = len(self.methods)
+        buttonSize = max(min(self.height//12, (buttonAreaWidth - 2*padding1 - (count - 1)*gap)//count), 1)
+        start = self.height + (buttonAreaWidth - count*buttonSize - (count - 1)*gap)//2
+        font = self.font if buttonSize >= self.font.get_height() else self.fontSmall
+        for k, button in enumerate(self.methodButtons):
+            button.size = (buttonSize, buttonSize)
+            button.left = start + k*(buttonSize + gap)
+            button.centery = self.height*11//12
+            color = self.colorButton if self.methodIndex == k else self.colorInitial
+            pygame.draw.rect(layer, color, button.move(-left, 0))
+            blitCentered(self.renderText(str(k + 1), font, self.colorFontDark), button.center)
+        return layer
+
+    def cellRect(self, y, x):
+        x1, x2 = divmod(x, self.boxSize)
+        y1, y2 = divmod(y, self.boxSize)
+        return pygame.Rect(
+            x1*self.boxLength + x2*self.cellLength + self.fact1,
+            y1*self.boxLength + y2*self.cellLength + self.fact1,
+            self.cellLength - self.lineThickness,
+            self.cellLength - self.lineThickness
+        )
+
+    """ Everything that decides how a cell looks: (number, is initial, is selected) """
+    def cellState(self, y, x):
+        selected = self.currentlySelected == (x, y)
+        if self.board[y][x]:
+            return self.board[y][x], False, selected
+        return self.initial[y][x], bool(self.initial[y][x]), selected
+
+    def drawCell(self, y, x, state):
+        num, initial, selected = state
+        rect = self.cellRect(y, x)
+        self.screen.blit(self.gridLayer, rect, rect)
+        if initial:
+            pygame.draw.rect(self.screen, self.colorInitial, rect)
+        elif selected:
+            pygame.draw.rect(self.screen, self.colorSelected, rect)
+            self.screen.blit(self.linesLayer, rect, rect)
+        if num:
+            txt = self.renderText(puzzles.SYMBOLS[num - 1], self.fontCell, self.colorFont)
+            self.screen.blit(txt, txt.get_rect(center = rect.center))
+        return rect
+
+    """ Redraws what changed since the last call: the cached layers only after
+    invalidate(), otherwise just the cells whose state differs. Returns the changed rects """
+    def setup(self):
+        start = time.perf_counter()
+        rects = []
+        if self.gridLayer is None:
+            self.gridLayer = self.renderGridLayer()
+            self.screen.blit(self.gridLayer, (0, 0))
+            rects.append(self.gridLayer.get_rect())
+            self.drawn = {}
+        if self.panelLayer is None:
+            self.panelLayer = self.renderPanelLayer()
+            rects.append(self.screen.blit(self.panelLayer, (self.height, 0)))
+            self.overlayDrawn = None
+        for y in range(self.size):
+            for x in range(self.size):
+                rect = self.refreshCell(y, x)
+                if rect:
+                    rects.append(rect)
+        if self.overlay:
+            rect = self.drawOverlay()
+            if rect:
+                rects.append(rect)
+        if rects:
+            pygame.display.update(rects)
+        if self.timing is not None:
+            self.timing["renderTime"] += time.perf_counter() - start
+            self.timing["frames"] += bool(rects)
+        return rects
+
+    """ The statistics of the last solve as lines of text """
+    def overlayLines(self):
+        if self.timing is None:
+            return ["Solve to see statistics"]
+        lines = []
+        if self.stats is None:
+            lines.append("Searching ...")
+        else:
+            stats = self.stats
+            lines.append("%d nodes, %d backtracks, depth %d" % (stats.nodes, stats.backtracks, stats.maxDepth))
+            lines.append("Branching on " + ", ".join(
+                "%d: %dx" % (count, stats.branching[count]) for count in sorted(stats.branching)
+            ))
+            if stats.peakMemory is not None:
+                # the UI thread allocates while the search runs, tracemalloc cannot tell them apart
+                lines.append("Peak memory of the process %.1f KB" % (stats.peakMemory/1024))
+        lines.append("Search %.1f ms, render %.1f ms" % (1000*self.timing["searchTime"], 1000*self.timing["renderTime"]))
+        lines.append("%d frames drawn" % self.timing["frames"])
+        return lines
+
+    """ Draws the overlay into the free space of the panel, returns its rect if it changed """
+    def drawOverlay(self):
+        lines = self.overlayLines()
+        if lines == self.overlayDrawn:
+            return None
+        self.overlayDrawn = lines
+        left = self.height
+        # below the longest description
+        top = self.height*31//60
+        area = pygame.Rect(left, top, self.width - left, self.height*2//3 - top)
+        self.screen.blit(self.panelLayer, area, area.move(-left, 0))
+        lineHeight = self.fontSmall.get_linesize()
+        # the numbers change every frame, so these lines are not worth caching
+        for i, line in enumerate(lines):
+            surface = self.fontSmall.render(line, True, self.colorFont)
+            self.screen.blit(surface, surface.get_rect(center = (area.centerx, top + lineHeight*i + lineHeight//2)))
+        return area
+
+    """ F3 shows and hides the overlay, while it is shown allocations are traced """
+    def toggleOverlay(self):
+        self.overlay = not self.overlay
+        if self.overlay:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        else:
+            tracemalloc.stop()
+            self.invalidate(grid=False)
+        self.setup()
+
+    """ Draws the cell if it changed, returns the rect to update or None """
+    def refreshCell(self, y, x):
+        state = self.cellState(y, x)
+        if self.drawn.get((y, x)) == state:
+            return None
+        self.drawn[(y, x)] = state
+        return self.drawCell(y, x, state)
+
+    """ Drops the cached layers, grid=False keeps the board """
+    def invalidate(self, grid=True):
+        if grid:
+            self.gridLayer = None
+        self.panelLayer = None
 
     def getCoordinates(self, pos):
         padding1 = self.padding1
         padding2 = self.padding2
-        third = self.boardSize//3
-        cellLength = (third - 2*padding2)//3
+        boxSize = self.boxSize
+        boxLength = self.boardSize//boxSize
+        cellLength = (boxLength - 2*padding2)//boxSize
         if padding1 <= pos[0] <= self.boardSize+padding1 and padding1 <= pos[1] <= self.boardSize+padding1:
             x, y = pos[0]-padding1, pos[1]-padding1
-            divX = x // third
-            divY = y // third
-            modX = x % third
-            modY = y % third
-            if padding2 <= modX <= 3*cellLength + padding2 and padding2 <= modY <= 3*cellLength + padding2:
+            divX = x // boxLength
+            divY = y // boxLength
+            modX = x % boxLength
+            modY = y % boxLength
+            if padding2 <= modX < boxSize*cellLength + padding2 and padding2 <= modY < boxSize*cellLength + padding2:
                 modX -= padding2
                 modY -= padding2
-                return (divX*3 + modX//cellLength, divY*3 + modY//cellLength)
+                return (divX*boxSize + modX//cellLength, divY*boxSize + modY//cellLength)
         return None
 
     def setMethod(self, to):
+        self.cancel()
+        self.trace = None
+        self.updateCaption()
         self.methodIndex = to
         self.method = self.methods[self.methodIndex]
-        self.setup() 
+        self.invalidate(grid=False)
+        self.setup()
 
     def click(self):
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit
+                sys.exit()
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F4 and event.mod == pygame.KMOD_LALT:
                     pygame.quit
                     sys.exit()
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_F4 and event.mod == pygame.KMOD_LALT:
-                        pygame.quit
-                        sys.exit()
-                    elif pygame.K_1 <= event.key <= pygame.K_9:
-                        if self.currentlySelected:
-                            i, j = self.currentlySelected
-                            self.board[j][i] = int(event.unicode)
-                            self.updateCell(int(event.unicode), j, i)
-                    elif pygame.K_BACKSPACE == event.key:
-                        if self.currentlySelected:
-                            i, j = self.currentlySelected
-                            self.board[j][i] = 0
-                            self.updateCell(0, j, i)
-                elif event.type == pygame.VIDEORESIZE:
-                    size = event.size
-                    self.onResize(size)
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    pos = pygame.mouse.get_pos()
-                    if self.buttSolve.collidepoint(pos):
-                        self.solve(method=self.method)
-                    elif self.buttNext.collidepoint(pos):
-                        self.loadNext()
-                    elif self.button1.collidepoint(pos):
-                        self.setMethod(0)
-                    elif self.button2.collidepoint(pos):
-                        self.setMethod(1)
+                elif event.key == pygame.K_F3:
+                    self.toggleOverlay()
+                elif event.key == pygame.K_ESCAPE:
+                    self.cancel()
+                    self.updateCaption()
+                elif self.symbolValues.get(event.unicode):
+                    if self.currentlySelected:
+                        i, j = self.currentlySelected
+                        self.updateCell(self.symbolValues[event.unicode], j, i)
+                elif pygame.K_BACKSPACE == event.key:
+                    if self.currentlySelected:
+                        i, j = self.currentlySelected
+                        self.updateCell(0, j, i)
+                elif self.trace is not None:
+                    self.playbackKey(event.key)
+            elif event.type == pygame.VIDEORESIZE:
+                size = event.size
+                self.onResize(size)
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                pos = pygame.mouse.get_pos()
+                if self.buttSolve.collidepoint(pos):
+                    self.solve(method=self.method)
+                elif self.buttNext.collidepoint(pos):
+                    self.loadNext()
+                else:
+                    for k, button in enumerate(self.methodButtons):
+                        if button.collidepoint(pos):
+                            self.setMethod(k)
+                            break
                     else:
                         coordinates = self.getCoordinates(pos)
                         if coordinates:
@@ -344,203 +525,172 @@ class Game():
                                 self.currentlySelected = None
                             self.setup()
 
+    """ space pauses, left/right step, up/down change the speed, home/end and page up/down seek """
+    def playbackKey(self, key):
+        if key == pygame.K_SPACE:
+            self.paused = not self.paused
+        elif key == pygame.K_RIGHT:
+            self.paused = True
+            self.seek(self.position + 1)
+        elif key == pygame.K_LEFT:
+            self.paused = True
+            self.seek(self.position - 1)
+        elif key == pygame.K_UP:
+            self.stepsPerFrame *= 2
+        elif key == pygame.K_DOWN:
+            self.stepsPerFrame /= 2
+        elif key == pygame.K_HOME:
+            self.seek(0)
+        elif key == pygame.K_END:
+            self.seek(len(self.trace))
+        elif key == pygame.K_PAGEUP:
+            self.seek(self.position + len(self.trace)//10)
+        elif key == pygame.K_PAGEDOWN:
+            self.seek(self.position - len(self.trace)//10)
+        self.updateCaption()
+
     def updateCell(self, num, y, x):
-        for event in pygame.event.get():
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F4 and event.mod == pygame.KMOD_LALT:
-                    pygame.quit
-                    sys.exit()
-            elif event.type == pygame.QUIT:
-                pygame.quit
-                sys.exit()
-        x1, x2 = divmod(x, 3)
-        y1, y2 = divmod(y, 3)
-        topLeft = (
-            x1*self.third + x2*self.cellLength + self.fact1,
-            y1*self.third + y2*self.cellLength + self.fact1,
-        )
-        if self.currentlySelected == (x, y):
-            color = self.colorSelected
-        else:
-            color = self.colorBackground
-        pygame.draw.rect(
-            self.screen,
-            color,
-            (
-                topLeft[0],
-                topLeft[1],
-                self.cellLength - self.lineThickness,
-                self.cellLength - self.lineThickness,
-            )
-        )
-        if num:
-            txt = self.numsRendered[num]
-            txtRect = txt.get_rect(center = (topLeft[0] + self.cellLength//2, topLeft[1] + self.cellLength//2))
-            self.screen.blit(txt, txtRect)
-        pygame.display.update()
+        self.board[y][x] = num
+        rect = self.refreshCell(y, x)
+        if rect:
+            pygame.display.update(rect)
 
     def solve(self, method = "Backtracking"):
-        start = time.time()
-        self.board = [
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0]
-        ]
+        start = time.perf_counter()
+        self.cancel()
+        self.board = [[0]*self.size for _ in range(self.size)]
         self.currentlySelected = None
+        self.stats = None
+        self.error = None
+        self.reported = False
+        self.cacheResult = None
+        # the search runs at full speed in the background, the animation
+        # is played back from the trace as far as the search has got
+        self.trace = solver.Trace(self.initial)
+        self.worker = worker.SolveWorker(self.initial, method, self.cacheFile)
+        self.position = 0
+        self.paused = False
+        self.stepBudget = 0
+        # brute force is shown fast, the other methods deliberately slowed down
+        self.stepsPerFrame = 32 if method == "Backtracking" else 10/self.fps
+        self.timing = {"method": method, "searchTime": time.perf_counter() - start, "renderTime": 0.0, "frames": 0}
         self.setup()
-        board = deepcopy(self.initial)
-        if method == "Backtracking":
-            res = self.solveBacktracking(board, 0, 0)
-        else:
-            candidates = [[[k for k in range(1, 10) if self.isValid(board, k, i, j)] if board[i][j] == 0 else None for j in range(len(board[i])) ] for i in range(len(board))]
-            res = self.solveDynamic(board, candidates)
-        if res:
-            for i in range(9):
-                for j in range(9):
-                    if not self.initial[i][j]:
-                        self.board[i][j] = board[i][j]
-            self.setup()
-        print(time.time()-start)
-
-    def solveDynamic(self, board, candidates):
-        time.sleep(0.1)
-        countFilled = 0
-        smallest = float("inf")
-        smallestInd = 0
-        for i in range(9):
-            for j in range(9):
-                if candidates[i][j] == None:
-                    countFilled += 1
-                elif len(candidates[i][j]) == 0:
-                    return False
-                elif len(candidates[i][j]) < smallest:
-                    smallest = len(candidates[i][j])
-                    smallestInd = (i, j)
-        if countFilled == 81:
-            return board
-        i, j = smallestInd
-        for candidate in candidates[i][j]:
-            newCand = self.newCandidates(deepcopy(candidates), candidate, i, j)
-            newCand[i][j] = None
-            board[i][j] = candidate
-            self.updateCell(candidate, i, j)
-            res = self.solveDynamic(board, newCand)
-            if res:
-                return res
-            board[i][j] = 0
-            self.updateCell(0, i, j)
-
-    def newCandidates(self, candidates, candidate, i, j):
-        for k in range(9):
-            try:
-                candidates[i][k].remove(candidate)
-            except:
-                pass
-            try:
-                candidates[k][j].remove(candidate)
-            except:
-                pass
-        # 3x3 field
-        i = i//3
-        j = j//3
-        for k in range(3):
-            for l in range(3):
-                try:
-                    candidates[3*i+k][3*j+l].remove(candidate)
-                except:
-                    pass
-        return candidates
-
-    def solveBacktracking(self, board, y, x):
-        if y == 9:
-            return board
-        if board[y][x]:
-            x += 1
-            y += x//9
-            x = x%9
-            return self.solveBacktracking(board, y, x)
-
-        for num in range(10):
-            if self.isValid(board, num, y, x):
-                self.updateCell(num, y, x)
-                board[y][x] = num
-                newX = x + 1
-                newY = y + newX//9
-                newX = newX%9
-                res = self.solveBacktracking(board, newY, newX)
-                if res:
-                    return res
-                board[y][x] = 0
-                self.updateCell(0, y, x)
-        return False
-
-    def isValid(self, board, num, y, x):
-        for i in range(9):
-            if board[y][i] == num or board[i][x] == num:
-                return False
-        y = 3*(y//3)
-        x = 3*(x//3)
-        for i in range(3):
-            for j in range(3):
-                if board[y+i][x+j] == num:
-                    return False
-        return True
-
-    def loadSudokus(self):
-        sudokus = []
-        with open("sudokus.txt", "r") as f:
-            sudoku = []
-            lines = f.readlines()
-            count = 0
-            for line in lines:
-                for char in line:
-                    if char == ".":
-                        num = 0
-                    elif "0" < char <= "9":
-                        num = int(char)
-                    else:
-                        continue
-                    if count % 9 == 0:
-                        if count == 81:
-                            sudokus.append(sudoku)
-                            sudoku = []
-                            count = 0
-                        sudoku.append([])
-                    sudoku[-1].append(num)
-                    count += 1
-        self.sudokus = sudokus
+        self.updateCaption()
+        self.report()
+
+    def searching(self):
+        return self.worker is not None and not self.worker.done
+
+    """ Moves what the background search found since the last frame into the trace """
+    def poll(self, timeout=0.005):
+        if not self.searching() or not self.worker.poll(self.trace, timeout):
+            return
+        self.stats = self.worker.solver.stats
+        if self.worker.done:
+            if self.worker.cacheStatistics:
+                self.cacheResult = dict(self.worker.cacheStatistics, hit=self.worker.cached is not None)
+                if self.worker.cached and self.worker.result:
+                    # another method or an equivalent puzzle may have found another solution
+                    self.cacheResult["matches"] = self.worker.cached == self.worker.result
+            if self.worker.error:
+                self.error = self.worker.error
+                print("search failed: %r" % self.error, file=sys.stderr)
+            self.timing["searchTime"] += self.stats.time
+        self.updateCaption()
+
+    """ Blocks until the search is over and the whole trace is there """
+    def finishSolve(self):
+        if self.searching():
+            self.worker.wait()
+            self.poll(float("inf"))
+
+    """ Stops the background search, what it found so far can still be played """
+    def cancel(self):
+        if self.searching():
+            self.worker.cancel()
+            self.reported = True
+        self.worker = None
+
+    """ Prints the statistics of the last solve as one JSON line, once its playback got to the end """
+    def report(self):
+        if self.reported or (self.trace is not None and (self.searching() or self.position < len(self.trace))):
+            return
+        self.reported = True
+        if self.quiet:
+            return
+        record = dict(self.timing, steps=len(self.trace) if self.trace is not None else 0)
+        if self.error:
+            record["error"] = repr(self.error)
+        if self.stats is not None:
+            record.update(self.stats.asDict())
+            # includes the rendering, headless solves measure the search alone
+            record["processPeakMemory"] = record.pop("peakMemory")
+        if self.cacheResult:
+            record["cache"] = self.cacheResult
+        print(json.dumps(record))
+
+    """ Plays the next steps of the trace, called once per frame """
+    def advance(self):
+        if self.trace is None or self.paused or self.position >= len(self.trace):
+            return
+        self.stepBudget += self.stepsPerFrame
+        steps = int(self.stepBudget)
+        self.stepBudget -= steps
+        end = min(self.position + steps, len(self.trace))
+        for k in range(self.position, end):
+            num, y, x = self.trace[k]
+            self.board[y][x] = num
+        self.position = end
+        self.report()
+        if steps:
+            self.updateCaption()
+
+    def seek(self, position):
+        self.position = max(0, min(position, len(self.trace)))
+        self.report()
+        board = self.trace.boardAt(self.position)
+        for i in range(self.size):
+            for j in range(self.size):
+                self.board[i][j] = 0 if self.initial[i][j] else board[i][j]
+
+    def updateCaption(self):
+        caption = "Sudoku Backtracking"
+        if self.trace is not None:
+            caption += " - step %d/%d%s, %g steps per frame%s" % (
+                self.position, len(self.trace), "+" if self.searching() else "",
+                self.stepsPerFrame, ", paused" if self.paused else ""
+            )
+        if self.error:
+            caption += " - search failed: %s" % type(self.error).__name__
+        pygame.display.set_caption(caption)
 
     def loadNext(self):
-        newIndex = self.indexSudokus
-        while newIndex == self.indexSudokus:
-            newIndex = randrange(len(self.sudokus))
-        self.indexSudokus = newIndex
-        self.initial = self.sudokus[newIndex]
-        self.board = [
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0]
-        ]
+        # a few tries to get a different one, a file might hold only one sudoku
+        for _ in range(10):
+            sudoku = puzzles.randomSudoku(self.sudokuFile, self.size)
+            if sudoku != self.initial:
+                break
+        self.cancel()
+        self.initial = sudoku
+        self.trace = None
+        self.error = None
+        self.updateCaption()
+        self.board = [[0]*self.size for _ in range(self.size)]
         self.setup()
 
     def play(self):
         self.setup()
         while True:
             self.click()
+            self.poll()
+            self.advance()
             self.setup()
+            self.clock.tick(self.fps)
 
 
 if __name__ == "__main__":
-    Game().play()
\ No newline at end of file
+    # python main.py [puzzle file] [board size]
+    args = sys.argv[1:3]
+    if len(args) > 1:
+        args[1] = int(args[1])
+    Game(*args).play()
\ No newline at end of file
@@ -0,0 +1,198 @@
+""" Logical rules that fill in or rule out candidates without guessing.
+
+Every rule takes a Grid and returns how many numbers it placed or
+candidates it removed. A rule that runs into a contradiction sets
+grid.broken instead.
+"""
+
+
+class Grid():
+    """ Board plus a candidate bitmask per cell (bit k for the number k)
+
+    The board and the trail of placed cells are shared between branches,
+    only the candidates are copied by branch().
+    """
+    def __init__(self, board, tables, observer=None):
+        n = tables.size
+        self.tables = tables
+        self.size = n
+        self.full = ((1 << n) - 1) << 1
+        self.board = board
+        self.observer = observer
+        self.trail = []
+        self.broken = False
+        # numbers used per row, column and box, a number twice in one is a contradiction
+        used = [0]*(3*n)
+        for y, x in tables.cells:
+            if board[y][x]:
+                bit = 1 << board[y][x]
+                for unit in (y, n + x, 2*n + tables.box[y][x]):
+                    if used[unit] & bit:
+                        self.broken = True
+                    used[unit] |= bit
+        self.cands = [
+            0 if board[y][x] else self.full & ~(used[y] | used[n + x] | used[2*n + tables.box[y][x]])
+            for y, x in tables.cells
+        ]
+        if not all(self.cands[y*n + x] for y, x in tables.cells if not board[y][x]):
+            self.broken = True
+
+    def branch(self):
+        grid = Grid.__new__(Grid)
+        grid.__dict__.update(self.__dict__)
+        grid.cands = self.cands[:]
+        return grid
+
+    def eliminate(self, cell, num):
+        bit = ~(1 << num)
+        cands = self.cands
+        n = self.size
+        for peer in self.tables.flatPeers[cell]:
+            if cands[peer]:
+                cands[peer] &= bit
+                if not cands[peer]:
+                    self.broken = True
+            elif not self.board[peer//n][peer%n]:
+                self.broken = True
+
+    def place(self, cell, num):
+        y, x = divmod(cell, self.size)
+        self.board[y][x] = num
+        self.cands[cell] = 0
+        self.trail.append(cell)
+        if self.observer is not None:
+            self.observer(num, y, x)
+        self.eliminate(cell, num)
+
+    def undo(self, mark):
+        """ Clears every cell placed since len(trail) was mark """
+        while len(self.trail) > mark:
+            y, x = divmod(self.trail.pop(), self.size)
+            self.board[y][x] = 0
+            if self.observer is not None:
+                self.observer(0, y, x)
+
+
+def nakedSingles(grid):
+    """ A cell with a single candidate gets that number """
+    count = 0
+    cands = grid.cands
+    for cell in range(len(cands)):
+        c = cands[cell]
+        if c and c & (c - 1) == 0:
+            grid.place(cell, c.bit_length() - 1)
+            count += 1
+            if grid.broken:
+                break
+    return count
+
+
+def hiddenSingles(grid):
+    """ A number that fits in only one cell of a unit goes there """
+    count = 0
+    n = grid.size
+    board = grid.board
+    cands = grid.cands
+    for unit in grid.tables.flatUnits:
+        placed = once = twice = 0
+        for cell in unit:
+            if cands[cell]:
+                twice |= once & cands[cell]
+                once |= cands[cell]
+            else:
+                placed |= 1 << board[cell//n][cell%n]
+        if (placed | once) != grid.full:
+            grid.broken = True
+            return count
+        singles = once & ~twice
+        while singles:
+            bit = singles & -singles
+            singles ^= bit
+            for cell in unit:
+                if cands[cell] & bit:
+                    grid.place(cell, bit.bit_length() - 1)
+                    count += 1
+                    break
+            if grid.broken:
+                return count
+    return count
+
+
+def lockedCandidates(grid):
+    """ Pointing and claiming: a number of a box that is confined to one line
+    is removed from the rest of that line, and the other way round """
+    count = 0
+    n = grid.size
+    tables = grid.tables
+    cands = grid.cands
+    units = tables.flatUnits
+    for b in range(n):
+        box = units[2*n + b]
+        union = 0
+        for cell in box:
+            union |= cands[cell]
+        while union:
+            bit = union & -union
+            union ^= bit
+            cells = [cell for cell in box if cands[cell] & bit]
+            if len(cells) < 2:
+                continue
+            rows = {cell//n for cell in cells}
+            cols = {cell%n for cell in cells}
+            if len(rows) == 1:
+                line = units[rows.pop()]
+            elif len(cols) == 1:
+                line = units[n + cols.pop()]
+            else:
+                continue
+            for cell in line:
+                if cands[cell] & bit and tables.flatBox[cell] != b:
+                    cands[cell] &= ~bit
+                    count += 1
+                    if not cands[cell]:
+                        grid.broken = True
+    for line in units[:2*n]:
+        union = 0
+        for cell in line:
+            union |= cands[cell]
+        while union:
+            bit = union & -union
+            union ^= bit
+            boxes = {tables.flatBox[cell] for cell in line if cands[cell] & bit}
+            if len(boxes) != 1:
+                continue
+            b = boxes.pop()
+            for cell in units[2*n + b]:
+                if cands[cell] & bit and cell not in line:
+                    cands[cell] &= ~bit
+                    count += 1
+                    if not cands[cell]:
+                        grid.broken = True
+    return count
+
+
+# cheap rules first, propagate() restarts from the top after any progress
+RULES = {
+    "nakedSingles": nakedSingles,
+    "hiddenSingles": hiddenSingles,
+    "lockedCandidates": lockedCandidates
+}
+
+
+def propagate(grid, rules, counters):
+    """ Applies the rules until none of them makes progress.
+    Returns False if the grid turned out to be unsolvable. """
+    if grid.broken:
+        return False
+    progress = True
+    while progress:
+        progress = False
+        for name in rules:
+            count = RULES[name](grid)
+            if grid.broken:
+                return False
+            if count:
+                counters[name] = counters.get(name, 0) + count
+                progress = True
+                break
+    return True
@@ -0,0 +1,96 @@
+""" Reading and writing puzzle files.
+
+Two formats are understood, also mixed in one file:
+a grid of n lines where "." or "0" is an empty cell and any other
+character is ignored, with puzzles separated by blank lines,
+or one puzzle per line as n*n characters (anything after them is ignored).
+Numbers above 9 are written as letters, A for 10 up to P for 25.
+"""
+import os
+from random import randrange
+
+SYMBOLS = "123456789ABCDEFGHIJKLMNOP"
+
+
+def symbols(size):
+    """ Character -> number for a board of size x size, empty cells are 0 """
+    values = {".": 0, "0": 0}
+    for num, char in enumerate(SYMBOLS[:size], 1):
+        values[char] = num
+        values[char.lower()] = num
+    return values
+
+
+def isOneLine(line, values, size=9):
+    line = line.strip()
+    return len(line) >= size*size and all(char in values for char in line[:size*size])
+
+
+def parseLines(lines, size=9):
+    """ Yields every sudoku in the lines as soon as its last cell is read """
+    values = symbols(size)
+    sudoku = []
+    for line in lines:
+        if isOneLine(line, values, size):
+            line = line.strip()
+            yield [[values[char] for char in line[size*k:size*(k + 1)]] for k in range(size)]
+            sudoku = []
+            continue
+        for char in line:
+            if char not in values:
+                continue
+            if not sudoku or len(sudoku[-1]) == size:
+                sudoku.append([])
+            sudoku[-1].append(values[char])
+            if len(sudoku) == size and len(sudoku[-1]) == size:
+                yield sudoku
+                sudoku = []
+
+
+def iterSudokus(filename="sudokus.txt", size=9):
+    with open(filename, "r") as f:
+        yield from parseLines(f, size)
+
+
+def loadSudokus(filename="sudokus.txt", size=9):
+    return list(iterSudokus(filename, size))
+
+
+def randomSudoku(filename="sudokus.txt", size=9):
+    """ Picks a puzzle at a random byte offset without reading the whole file.
+
+    From the offset on, lines are skipped until the start of the next
+    puzzle: a one line puzzle or the first line after a blank line.
+    If there is none, for example in grids without blank lines between
+    them, one pass over the file picks a puzzle uniformly instead.
+    Packed libraries written by store.py are read by index instead.
+    """
+    import store
+    if store.isStore(filename):
+        with store.Store(filename) as library:
+            return library.random()
+    values = symbols(size)
+    with open(filename, "rb") as f:
+        f.seek(randrange(max(os.path.getsize(filename), 1)))
+        f.readline()
+        lines = (line.decode() for line in f)
+        for line in lines:
+            if isOneLine(line, values, size):
+                return next(parseLines([line], size))
+            if not line.strip():
+                break
+        else:
+            lines = ()
+        for sudoku in parseLines(lines, size):
+            return sudoku
+    # reservoir sampling, the file is not held in memory
+    chosen = None
+    for count, sudoku in enumerate(iterSudokus(filename, size), 1):
+        if randrange(count) == 0:
+            chosen = sudoku
+    return chosen
+
+
+def formatSudoku(sudoku):
+    """ One line of n*n characters, "." for an empty cell """
+    return "".join(SYMBOLS[num - 1] if num else "." for row in sudoku for num in row)
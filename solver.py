@@ -0,0 +1,692 @@
+import json
+import time
+import tracemalloc
+from array import array
+from math import isqrt
+
+import propagation
+
+# bits 1..9 of a mask stand for the numbers 1..9, larger boards use more bits
+FULL = 0b1111111110
+POPCOUNT = [bin(i).count("1") for i in range(FULL + 1)]
+
+
+def popcounter(size):
+    """ Counts the set bits of a mask, by table lookup up to 9x9 """
+    if size <= 9:
+        return POPCOUNT.__getitem__
+    return lambda mask: bin(mask).count("1")
+
+
+class Tables():
+    """ Precomputed units and peers for a board of boxSize x boxSize boxes """
+    def __init__(self, boxSize=3):
+        n = boxSize*boxSize
+        self.boxSize = boxSize
+        self.size = n
+        self.cells = [(y, x) for y in range(n) for x in range(n)]
+        self.box = [[boxSize*(y//boxSize) + x//boxSize for x in range(n)] for y in range(n)]
+        rows = [[(y, x) for x in range(n)] for y in range(n)]
+        cols = [[(y, x) for y in range(n)] for x in range(n)]
+        boxes = [[] for _ in range(n)]
+        for y, x in self.cells:
+            boxes[self.box[y][x]].append((y, x))
+        self.units = rows + cols + boxes
+        # the row, column and box every cell belongs to
+        self.cellUnits = [[(rows[y], cols[x], boxes[self.box[y][x]]) for x in range(n)] for y in range(n)]
+        # every other cell sharing a unit, 20 for a 9x9 board
+        self.peers = [[
+            tuple(sorted(set(rows[y] + cols[x] + boxes[self.box[y][x]]) - {(y, x)}))
+            for x in range(n)
+        ] for y in range(n)]
+        # the same with flat indices y*size + x, units are ordered rows, columns, boxes
+        self.flatBox = [self.box[y][x] for y, x in self.cells]
+        self.flatUnits = [[y*n + x for y, x in unit] for unit in self.units]
+        self.flatPeers = [[i*n + j for i, j in self.peers[y][x]] for y, x in self.cells]
+
+
+TABLES = {}
+
+def getTables(boxSize=3):
+    if boxSize not in TABLES:
+        TABLES[boxSize] = Tables(boxSize)
+    return TABLES[boxSize]
+
+
+def tablesFor(board):
+    """ The tables for a board of n x n cells, n has to be a square (9, 16, 25, ...) """
+    boxSize = isqrt(len(board))
+    if boxSize*boxSize != len(board):
+        raise ValueError("A board of size %d has no square boxes" % len(board))
+    return getTables(boxSize)
+
+
+class DancingLinks():
+    """ Exact cover matrix of an empty board as circular linked lists in flat arrays
+
+    Node 0 is the root, nodes 1..4*n*n are the column headers for the
+    cell, row-number, column-number and box-number constraints, every
+    (y, x, num) placement is a row of four nodes after that.
+    Solvers work on copies of L, R, U, D and S, the rest is shared.
+    """
+    def __init__(self, boxSize=3):
+        n = boxSize*boxSize
+        box = getTables(boxSize).box
+        columns = 4*n*n
+        self.L = [columns] + list(range(columns))
+        self.R = list(range(1, columns + 1)) + [0]
+        self.U = list(range(columns + 1))
+        self.D = list(range(columns + 1))
+        self.C = list(range(columns + 1))
+        self.S = [0]*(columns + 1)
+        self.rowOf = [None]*(columns + 1)
+        self.rowStart = {}
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        for y in range(n):
+            for x in range(n):
+                for num in range(1, n + 1):
+                    first = len(C)
+                    self.rowStart[(y, x, num)] = first
+                    for k, c in enumerate((
+                        1 + y*n + x,
+                        1 + n*n + y*n + num - 1,
+                        1 + 2*n*n + x*n + num - 1,
+                        1 + 3*n*n + box[y][x]*n + num - 1
+                    )):
+                        node = len(C)
+                        C.append(c)
+                        self.rowOf.append((y, x, num))
+                        U.append(U[c])
+                        D.append(c)
+                        D[U[c]] = node
+                        U[c] = node
+                        S[c] += 1
+                        L.append(node - 1 if k else first + 3)
+                        R.append(node + 1 if k < 3 else first)
+
+
+LINKS = {}
+
+def getDancingLinks(boxSize=3):
+    if boxSize not in LINKS:
+        LINKS[boxSize] = DancingLinks(boxSize)
+    return LINKS[boxSize]
+
+
+class Stats():
+    def __init__(self):
+        self.nodes = 0
+        self.backtracks = 0
+        self.maxDepth = 0
+        self.time = 0.0
+        # placements and eliminations per propagation rule
+        self.rules = {}
+        # number of candidates -> how often the search branched on that many
+        self.branching = {}
+        # bytes allocated at the peak, only measured while tracemalloc is tracing
+        self.peakMemory = None
+        # solutions found by DLX, which keeps searching for countSolutions()
+        self.solutions = 0
+
+    def branch(self, count):
+        self.branching[count] = self.branching.get(count, 0) + 1
+
+    def asDict(self):
+        return {
+            "nodes": self.nodes,
+            "backtracks": self.backtracks,
+            "maxDepth": self.maxDepth,
+            "time": self.time,
+            "rules": self.rules,
+            "branching": {str(count): self.branching[count] for count in sorted(self.branching)},
+            "peakMemory": self.peakMemory,
+            "solutions": self.solutions
+        }
+
+
+class Trace():
+    """ Compact record of a search, usable as observer.
+
+    Every step is stored as one number cell << 5 | num where num 0 takes
+    the number out again, which fits 16 bits up to 25x25 boards. Every CHECKPOINT steps the board is saved,
+    so boardAt() can seek without replaying from the start.
+    """
+    CHECKPOINT = 4096
+
+    def __init__(self, board):
+        self.size = len(board)
+        self.start = bytes(num for row in board for num in row)
+        self.steps = array("H")
+        self.current = bytearray(self.start)
+        self.checkpoints = [self.start]
+
+    def __call__(self, num, y, x):
+        cell = y*self.size + x
+        self.steps.append(cell << 5 | num)
+        self.current[cell] = num
+        if len(self.steps) % self.CHECKPOINT == 0:
+            self.checkpoints.append(bytes(self.current))
+
+    def extend(self, steps):
+        """ Appends steps that are already encoded like self.steps """
+        start = 0
+        while start < len(steps):
+            # up to the next checkpoint
+            end = min(len(steps), start + self.CHECKPOINT - len(self.steps) % self.CHECKPOINT)
+            part = steps[start:end]
+            for step in part:
+                self.current[step >> 5] = step & 31
+            self.steps.extend(part)
+            if len(self.steps) % self.CHECKPOINT == 0:
+                self.checkpoints.append(bytes(self.current))
+            start = end
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __getitem__(self, index):
+        """ (num, y, x) of a step """
+        step = self.steps[index]
+        y, x = divmod(step >> 5, self.size)
+        return step & 31, y, x
+
+    def boardAt(self, position):
+        """ The board after the first position steps """
+        position = max(0, min(position, len(self.steps)))
+        checkpoint = position//self.CHECKPOINT
+        cells = bytearray(self.checkpoints[checkpoint])
+        for step in self.steps[checkpoint*self.CHECKPOINT:position]:
+            cells[step >> 5] = step & 31
+        n = self.size
+        return [list(cells[y*n:(y + 1)*n]) for y in range(n)]
+
+
+class SearchAborted(Exception):
+    """ The search needed more nodes than its budget """
+
+
+class Solver():
+    """ Solves sudokus without any rendering.
+
+    observer(num, y, x) is called for every placement (num > 0) and every
+    undo (num == 0), so a GUI can animate the search.
+    """
+    methods = [
+        "Backtracking",
+        "Dynamic",
+        "Bitmask",
+        "DLX",
+        "Propagation"
+    ]
+
+    def __init__(self, observer=None, rules=None):
+        """ rules are the names of the propagation rules to use, all by default """
+        self.observer = observer
+        self.rules = list(propagation.RULES) if rules is None else rules
+        self.stats = Stats()
+        # most nodes a search may visit before it raises SearchAborted, None is no limit
+        self.budget = None
+
+    def prepare(self, board):
+        """ Resets the statistics and the tables for the size of board, returns a copy of it """
+        self.stats = Stats()
+        self.tables = tablesFor(board)
+        self.size = self.tables.size
+        self.full = ((1 << self.size) - 1) << 1
+        self.popcount = popcounter(self.size)
+        return [row[:] for row in board]
+
+    def solve(self, board, method="Backtracking"):
+        """ Returns (solution, stats), solution is False if there is none """
+        board = self.prepare(board)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        if method in self.resumable:
+            res = self.run(self.resumable[method](self, board))
+        elif method == "Bitmask":
+            res = self.solveBitmask(board)
+        elif method == "DLX":
+            res = self.solveDLX(board)
+        elif method == "Propagation":
+            res = self.searchPropagation(propagation.Grid(board, self.tables, self.observer), 0)
+        else:
+            raise ValueError("Unknown method: %s" % method)
+        self.stats.time = time.perf_counter() - start
+        if tracing:
+            self.stats.peakMemory = tracemalloc.get_traced_memory()[1] - memory
+        return res or False, self.stats
+
+    def run(self, search):
+        """ Runs a resumable search to the end, passing every step to the observer """
+        observer = self.observer
+        try:
+            if observer is None:
+                while True:
+                    next(search)
+            while True:
+                observer(*next(search))
+        except StopIteration as stop:
+            return stop.value
+
+    def countSolutions(self, board, limit=2):
+        """ Returns the number of solutions, counting stops at limit.
+        The default answers whether a puzzle is unique, None is no limit. """
+        board = self.prepare(board)
+        start = time.perf_counter()
+        self.solveDLX(board, limit or float("inf"))
+        self.stats.time = time.perf_counter() - start
+        return self.stats.solutions
+
+    def solveWithout(self, board, y, x, num):
+        """ A solution that does not have num at (y, x), or False.
+        If board without its given (y, x) has none, taking it out keeps the puzzle unique. """
+        board = self.prepare(board)
+        board[y][x] = 0
+        grid = propagation.Grid(board, self.tables)
+        cell = y*self.size + x
+        grid.cands[cell] &= ~(1 << num)
+        if not grid.cands[cell]:
+            return False
+        return self.searchPropagation(grid, 0) or False
+
+    def notify(self, num, y, x):
+        if self.observer is not None:
+            self.observer(num, y, x)
+
+    def enter(self, depth):
+        self.stats.nodes += 1
+        if self.budget is not None and self.stats.nodes > self.budget:
+            raise SearchAborted()
+        if depth > self.stats.maxDepth:
+            self.stats.maxDepth = depth
+
+    def searchDynamic(self, board):
+        n = self.size
+        peers = self.tables.peers
+        candidates = initialCandidates(board, self.tables)
+        # removed candidates as (list, index, number), to put them back on undo
+        trail = []
+        # per level the cell, its candidates and the trail length before it
+        stack = []
+        # how many of the candidates of each level were tried
+        tried = []
+        while True:
+            self.enter(len(stack))
+            countFilled = 0
+            smallest = float("inf")
+            smallestInd = 0
+            dead = False
+            for i in range(n):
+                for j in range(n):
+                    if candidates[i][j] == None:
+                        countFilled += 1
+                    elif len(candidates[i][j]) == 0:
+                        dead = True
+                        break
+                    elif len(candidates[i][j]) < smallest:
+                        smallest = len(candidates[i][j])
+                        smallestInd = (i, j)
+                if dead:
+                    break
+            if countFilled == n*n:
+                return board
+            if not dead:
+                i, j = smallestInd
+                self.stats.branch(smallest)
+                stack.append((i, j, candidates[i][j], len(trail)))
+                tried.append(0)
+                candidates[i][j] = None
+            # take back placements until a cell has an untried candidate
+            while True:
+                if not stack:
+                    return False
+                i, j, options, mark = stack[-1]
+                k = tried[-1]
+                if k:
+                    board[i][j] = 0
+                    while len(trail) > mark:
+                        cell, index, num = trail.pop()
+                        cell.insert(index, num)
+                    self.stats.backtracks += 1
+                    yield 0, i, j
+                if k < len(options):
+                    break
+                stack.pop()
+                tried.pop()
+                candidates[i][j] = options
+            candidate = options[k]
+            tried[-1] = k + 1
+            for y, x in peers[i][j]:
+                cell = candidates[y][x]
+                if cell and candidate in cell:
+                    index = cell.index(candidate)
+                    del cell[index]
+                    trail.append((cell, index, candidate))
+            board[i][j] = candidate
+            yield candidate, i, j
+
+    def searchBacktracking(self, board):
+        n = self.size
+        peers = self.tables.peers
+        # the search only moves over the empty cells, in reading order
+        empties = [(y, x) for y in range(n) for x in range(n) if not board[y][x]]
+        # number placed on each of the cells filled so far and the numbers its peers had
+        stack = []
+        num = 0
+        while True:
+            depth = len(stack)
+            if depth == len(empties):
+                return board
+            y, x = empties[depth]
+            if not num:
+                self.enter(depth)
+                used = usedNumbers(board, peers, y, x)
+                count = n - len(used) + (0 in used)
+                if count:
+                    self.stats.branch(count)
+            num += 1
+            while num in used:
+                num += 1
+            if num <= n:
+                board[y][x] = num
+                stack.append((num, used))
+                yield num, y, x
+                num = 0
+            else:
+                if not stack:
+                    return False
+                num, used = stack.pop()
+                y, x = empties[depth - 1]
+                board[y][x] = 0
+                self.stats.backtracks += 1
+                yield 0, y, x
+
+    # methods whose search yields every step, run() passes them to the observer
+    resumable = {
+        "Backtracking": searchBacktracking,
+        "Dynamic": searchDynamic
+    }
+
+    def solveBitmask(self, board):
+        # bit k of a mask is set if k is already used in that row/column/box
+        n = self.size
+        rows = [0]*n
+        cols = [0]*n
+        boxes = [0]*n
+        empties = []
+        box = self.tables.box
+        for i in range(n):
+            for j in range(n):
+                num = board[i][j]
+                b = box[i][j]
+                if num:
+                    bit = 1 << num
+                    if (rows[i] | cols[j] | boxes[b]) & bit:
+                        return False
+                    rows[i] |= bit
+                    cols[j] |= bit
+                    boxes[b] |= bit
+                else:
+                    empties.append((i, j, b))
+        return self.searchBitmask(board, rows, cols, boxes, empties, 0)
+
+    def searchBitmask(self, board, rows, cols, boxes, empties, depth):
+        self.enter(depth)
+        if not empties:
+            return board
+        # pick the cell with the fewest candidates
+        full = self.full
+        popcount = self.popcount
+        smallest = self.size + 1
+        smallestInd = 0
+        for k, (i, j, b) in enumerate(empties):
+            count = popcount(~(rows[i] | cols[j] | boxes[b]) & full)
+            if count < smallest:
+                if count == 0:
+                    return False
+                smallest = count
+                smallestInd = k
+                if count == 1:
+                    break
+        # move it to the end so it can be popped and pushed back in O(1)
+        last = len(empties) - 1
+        empties[smallestInd], empties[last] = empties[last], empties[smallestInd]
+        i, j, b = empties.pop()
+        free = ~(rows[i] | cols[j] | boxes[b]) & full
+        self.stats.branch(smallest)
+        while free:
+            bit = free & -free
+            free ^= bit
+            num = bit.bit_length() - 1
+            rows[i] |= bit
+            cols[j] |= bit
+            boxes[b] |= bit
+            board[i][j] = num
+            self.notify(num, i, j)
+            res = self.searchBitmask(board, rows, cols, boxes, empties, depth + 1)
+            if res:
+                return res
+            rows[i] ^= bit
+            cols[j] ^= bit
+            boxes[b] ^= bit
+            board[i][j] = 0
+            self.stats.backtracks += 1
+            self.notify(0, i, j)
+        empties.append((i, j, b))
+        empties[smallestInd], empties[last] = empties[last], empties[smallestInd]
+        return False
+
+    def solveDLX(self, board, limit=1):
+        """ Stops at the limit-th solution, stats.solutions is how many were found """
+        links = getDancingLinks(self.tables.boxSize)
+        L, R, U, D, S = links.L[:], links.R[:], links.U[:], links.D[:], links.S[:]
+        C = links.C
+        rowOf = links.rowOf
+
+        def cover(c):
+            L[R[c]] = L[c]
+            R[L[c]] = R[c]
+            i = D[c]
+            while i != c:
+                j = R[i]
+                while j != i:
+                    U[D[j]] = U[j]
+                    D[U[j]] = D[j]
+                    S[C[j]] -= 1
+                    j = R[j]
+                i = D[i]
+
+        def uncover(c):
+            i = U[c]
+            while i != c:
+                j = L[i]
+                while j != i:
+                    S[C[j]] += 1
+                    U[D[j]] = j
+                    D[U[j]] = j
+                    j = L[j]
+                i = U[i]
+            L[R[c]] = c
+            R[L[c]] = c
+
+        # the given numbers are chosen rows before the search starts
+        for y in range(self.size):
+            for x in range(self.size):
+                if board[y][x]:
+                    r = links.rowStart[(y, x, board[y][x])]
+                    j = r
+                    while True:
+                        # the column was already covered by another given
+                        if R[L[C[j]]] != C[j]:
+                            return False
+                        cover(C[j])
+                        j = R[j]
+                        if j == r:
+                            break
+
+        # explicit stack of chosen rows instead of recursion
+        stack = []
+        first = None
+        while True:
+            self.enter(len(stack))
+            r = None
+            if R[0] == 0:
+                self.stats.solutions += 1
+                if self.stats.solutions >= limit:
+                    return board
+                # keep searching as if it was a dead end
+                first = first or [row[:] for row in board]
+            else:
+                # column with the fewest remaining rows
+                c = R[0]
+                best = c
+                while c:
+                    if S[c] < S[best]:
+                        best = c
+                        if S[c] <= 1:
+                            break
+                    c = R[c]
+                if S[best]:
+                    self.stats.branch(S[best])
+                    cover(best)
+                    r = D[best]
+            # backtrack until a chosen row has an untried alternative
+            while r is None:
+                if not stack:
+                    return first or False
+                r = stack.pop()
+                y, x, num = rowOf[r]
+                board[y][x] = 0
+                self.stats.backtracks += 1
+                self.notify(0, y, x)
+                j = L[r]
+                while j != r:
+                    uncover(C[j])
+                    j = L[j]
+                c = C[r]
+                r = D[r]
+                if r == c:
+                    uncover(c)
+                    r = None
+            j = R[r]
+            while j != r:
+                cover(C[j])
+                j = R[j]
+            stack.append(r)
+            y, x, num = rowOf[r]
+            board[y][x] = num
+            self.notify(num, y, x)
+
+    def searchPropagation(self, grid, depth):
+        self.enter(depth)
+        if not propagation.propagate(grid, self.rules, self.stats.rules):
+            return False
+        # branch on the cell with the fewest candidates
+        popcount = self.popcount
+        smallest = self.size + 1
+        cell = None
+        for k, c in enumerate(grid.cands):
+            if c and popcount(c) < smallest:
+                smallest = popcount(c)
+                cell = k
+                if smallest == 1:
+                    break
+        if cell is None:
+            return grid.board
+        free = grid.cands[cell]
+        self.stats.branch(smallest)
+        while free:
+            bit = free & -free
+            free ^= bit
+            mark = len(grid.trail)
+            child = grid.branch()
+            child.place(cell, bit.bit_length() - 1)
+            res = self.searchPropagation(child, depth + 1)
+            if res:
+                return res
+            grid.undo(mark)
+            self.stats.backtracks += 1
+        return False
+
+
+def usedNumbers(board, peers, y, x):
+    """ The numbers on the peers of (y, x), 0 included if one of them is empty """
+    return {board[i][j] for i, j in peers[y][x]}
+
+
+def initialCandidates(board, tables=None):
+    tables = tables or tablesFor(board)
+    peers = tables.peers
+    n = tables.size
+    candidates = []
+    for i in range(n):
+        candidates.append([])
+        for j in range(n):
+            if board[i][j]:
+                candidates[i].append(None)
+            else:
+                used = usedNumbers(board, peers, i, j)
+                candidates[i].append([k for k in range(1, n + 1) if k not in used])
+    return candidates
+
+
+def solve(board, method="Backtracking", observer=None):
+    return Solver(observer).solve(board, method)
+
+
+def compare(sudokus, method, rules=None, label=None, jsonLines=None):
+    """ Solves all sudokus with one method and prints the totals,
+    the statistics of every single solve go to the file jsonLines if given """
+    solved = nodes = backtracks = 0
+    counters = {}
+    start = time.perf_counter()
+    for k, sudoku in enumerate(sudokus):
+        res, stats = Solver(rules=rules).solve(sudoku, method)
+        if jsonLines:
+            record = {"method": label or method, "puzzle": k, "solved": bool(res)}
+            record.update(stats.asDict())
+            jsonLines.write(json.dumps(record) + "\n")
+        solved += bool(res)
+        nodes += stats.nodes
+        backtracks += stats.backtracks
+        for name, count in stats.rules.items():
+            counters[name] = counters.get(name, 0) + count
+    print("%-30s solved %d/%d  nodes %10d  backtracks %10d  time %8.3fs  %s" % (
+        label or method, solved, len(sudokus), nodes, backtracks, time.perf_counter() - start,
+        " ".join("%s=%d" % item for item in counters.items())
+    ))
+
+
+if __name__ == "__main__":
+    import argparse
+    import puzzles
+
+    parser = argparse.ArgumentParser(description="Compare the solver methods without a display")
+    parser.add_argument("file", nargs="?", default="sudokus.txt")
+    parser.add_argument("--size", type=int, default=9, help="board size, 16 for hexadoku")
+    parser.add_argument("--methods", nargs="+", choices=Solver.methods, default=Solver.methods)
+    parser.add_argument("--rules", nargs="*", choices=list(propagation.RULES), default=list(propagation.RULES),
+                        help="propagation rules used by the Propagation method")
+    parser.add_argument("--ablation", action="store_true",
+                        help="also run Propagation once without each of the rules")
+    parser.add_argument("--json", default=None, help="file to write the statistics of every solve to, one JSON object per line")
+    parser.add_argument("--memory", action="store_true", help="measure the peak allocation of every solve, slows it down")
+    args = parser.parse_args()
+
+    sudokus = puzzles.loadSudokus(args.file, args.size)
+    if args.memory:
+        tracemalloc.start()
+    jsonLines = open(args.json, "w") if args.json else None
+    try:
+        for method in args.methods:
+            compare(sudokus, method, args.rules, jsonLines=jsonLines)
+        if args.ablation:
+            for name in args.rules:
+                rules = [rule for rule in args.rules if rule != name]
+                compare(sudokus, "Propagation", rules, "Propagation -" + name, jsonLines)
+    finally:
+        if jsonLines:
+            jsonLines.close()
@@ -0,0 +1,136 @@
+""" Packed binary puzzle library with memory-mapped random access.
+
+    python store.py sudokus.txt sudokus.bin --solutions
+
+Layout: a 16 byte header (magic, version, board size, flags, count)
+followed by fixed size records. A record is the puzzle with two cells
+per byte (one byte per cell for boards larger than 15x15), optionally
+followed by the solution packed the same way.
+"""
+import argparse
+import mmap
+import struct
+from itertools import tee
+from random import randrange
+
+import batch
+import puzzles
+
+MAGIC = b"SUDK"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBxQ")
+# flags
+SOLUTIONS = 1
+BYTES = 2
+
+
+def isStore(filename):
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def cellBytes(size, flags):
+    if flags & BYTES:
+        return size*size
+    return (size*size + 1)//2
+
+
+def pack(sudoku, flags):
+    cells = [num for row in sudoku for num in row]
+    if flags & BYTES:
+        return bytes(cells)
+    if len(cells) % 2:
+        cells.append(0)
+    return bytes(cells[k] << 4 | cells[k + 1] for k in range(0, len(cells), 2))
+
+
+def unpack(data, size, flags):
+    if flags & BYTES:
+        cells = list(data)
+    else:
+        cells = []
+        for byte in data:
+            cells.append(byte >> 4)
+            cells.append(byte & 15)
+    return [cells[k*size:(k + 1)*size] for k in range(size)]
+
+
+class Store():
+    """ Read only view of a packed library, a record is only decoded when asked for """
+    def __init__(self, filename):
+        self.file = open(filename, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, self.flags, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a puzzle store" % filename)
+        self.cellBytes = cellBytes(self.size, self.flags)
+        self.recordSize = self.cellBytes*(2 if self.flags & SOLUTIONS else 1)
+
+    def __len__(self):
+        return self.count
+
+    def offset(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return HEADER.size + index*self.recordSize
+
+    def __getitem__(self, index):
+        start = self.offset(index)
+        return unpack(self.map[start:start + self.cellBytes], self.size, self.flags)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def solution(self, index):
+        """ The stored solution, None if the library has none """
+        if not self.flags & SOLUTIONS:
+            return None
+        start = self.offset(index) + self.cellBytes
+        return unpack(self.map[start:start + self.cellBytes], self.size, self.flags)
+
+    def random(self):
+        return self[randrange(self.count)]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert(source, target, solutions=False, size=9, method="DLX", workers=None):
+    """ Streams a text puzzle file into a packed library, returns the number of puzzles """
+    flags = (SOLUTIONS if solutions else 0) | (BYTES if size > 15 else 0)
+    sudokus = puzzles.iterSudokus(source, size)
+    if solutions:
+        # the solver runs only a few chunks ahead, so tee buffers little
+        sudokus, toSolve = tee(sudokus)
+        results = batch.solveAll(toSolve, method, workers)
+    count = 0
+    with open(target, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, flags, 0))
+        for sudoku in sudokus:
+            f.write(pack(sudoku, flags))
+            if solutions:
+                res = next(results)[0]
+                f.write(pack(res or [[0]*size]*size, flags))
+            count += 1
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, size, flags, count))
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a text puzzle file into a packed library")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    parser.add_argument("--solutions", action="store_true", help="also store the solutions")
+    parser.add_argument("--workers", type=int, default=None, help="processes used for solving")
+    parser.add_argument("--size", type=int, default=9, help="board size, 9, 16 or 25")
+    args = parser.parse_args()
+    print("%d puzzles written" % convert(args.source, args.target, args.solutions, args.size, workers=args.workers))
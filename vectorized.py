@@ -0,0 +1,175 @@
+""" Solves thousands of puzzles at once with NumPy.
+
+    python vectorized.py sudokus.txt --output solutions.txt
+
+The puzzles of a chunk are one (N, 81) uint8 array, the candidates of
+every cell one (N, 81) uint16 array with bit k - 1 for the number k.
+Naked and hidden singles are applied to all grids at the same time until
+none of them changes any more, only the grids that are still not full
+are given to the normal solver one by one. Needs numpy, and the board
+has to fit the candidates into 16 bits, so 9x9 and 16x16.
+"""
+import argparse
+import sys
+import time
+from math import isqrt
+
+import numpy as np
+
+import batch
+import puzzles
+import solver
+
+# (cells of every unit, units of every cell, bit -> number) per board size
+TABLES = {}
+
+
+def getTables(size):
+    if size not in TABLES:
+        if size > 16:
+            raise ValueError("%dx%d candidates do not fit into 16 bits" % (size, size))
+        tables = solver.getTables(isqrt(size))
+        units = np.array(tables.flatUnits, dtype=np.intp)
+        cellUnits = np.array([(y, size + x, 2*size + tables.box[y][x]) for y, x in tables.cells], dtype=np.intp)
+        # number of the lowest set bit of each mask, 0 for no bit
+        lowest = np.zeros(1 << size, dtype=np.uint8)
+        for k in range(size, 0, -1):
+            lowest[np.arange(1 << size) & (1 << (k - 1)) != 0] = k
+        TABLES[size] = units, cellUnits, lowest
+    return TABLES[size]
+
+
+def toArray(sudokus):
+    """ (N, n*n) uint8 array of the sudokus as read by puzzles.loadSudokus """
+    return np.array([[num for row in sudoku for num in row] for sudoku in sudokus], dtype=np.uint8).reshape(len(sudokus), -1)
+
+
+def candidates(grids, units, cellUnits):
+    """ Candidate masks of the empty cells, 0 for the filled ones """
+    size = units.shape[1]
+    # shifting by the number itself would push 16 out of 16 bits
+    bits = np.where(grids, np.left_shift(np.uint16(1), grids.astype(np.uint16) - 1), 0).astype(np.uint16)
+    used = np.bitwise_or.reduce(bits[:, units], axis=2)
+    used = np.bitwise_or.reduce(used[:, cellUnits], axis=2)
+    full = np.uint16((1 << size) - 1)
+    return np.where(grids == 0, full & ~used, 0).astype(np.uint16)
+
+
+def propagate(grids):
+    """ Fills in naked and hidden singles of all grids in place until nothing changes.
+    Returns the mask of the grids that are full now. """
+    n = isqrt(grids.shape[1])
+    units, cellUnits, lowest = getTables(n)
+    # only grids that changed in the last round are looked at again
+    active = np.arange(len(grids))
+    while len(active):
+        part = grids[active]
+        cands = candidates(part, units, cellUnits)
+        # naked singles: a single bit set
+        single = (cands != 0) & (cands & (cands - 1) == 0)
+        # hidden singles: a number that only one cell of a unit can take,
+        # units with a new naked single wait for the next round
+        inUnit = cands[:, units]
+        once = np.zeros(inUnit.shape[:2], dtype=np.uint16)
+        twice = np.zeros_like(once)
+        for i in range(n):
+            twice |= once & inUnit[:, :, i]
+            once |= inUnit[:, :, i]
+        once &= ~twice
+        once[single[:, units].any(axis=2)] = 0
+        hidden = np.zeros_like(cands)
+        found = inUnit & once[:, :, None]
+        # rows, columns and boxes each cover every cell once
+        for t in range(3):
+            hidden[:, units[t*n:(t + 1)*n].ravel()] |= found[:, t*n:(t + 1)*n].reshape(len(part), -1)
+        # a cell that is a hidden single for two numbers is a contradiction the solver will find
+        place = single | (hidden != 0)
+        part[place] = lowest[np.where(single, cands, hidden)[place]]
+        grids[active] = part
+        active = active[place.any(axis=1) & (part == 0).any(axis=1)]
+    return (grids != 0).all(axis=1)
+
+
+def isValid(grids):
+    """ Mask of the grids without a number twice in a row, column or box """
+    units = getTables(isqrt(grids.shape[1]))[0]
+    values = np.sort(grids[:, units], axis=2)
+    repeated = (values[:, :, 1:] == values[:, :, :-1]) & (values[:, :, 1:] != 0)
+    return ~repeated.any(axis=(1, 2))
+
+
+def checkCandidates(sudokus):
+    """ Number of empty cells whose mask differs from solver.initialCandidates """
+    n = len(sudokus[0])
+    units, cellUnits, _ = getTables(n)
+    masks = candidates(toArray(sudokus), units, cellUnits).reshape(len(sudokus), n, n)
+    wrong = 0
+    for sudoku, mask in zip(sudokus, masks):
+        for i, row in enumerate(solver.initialCandidates(sudoku)):
+            for j, cell in enumerate(row):
+                if cell is not None and int(mask[i][j]) != sum(1 << (k - 1) for k in cell):
+                    wrong += 1
+    return wrong
+
+
+def solveAll(sudokus, method="DLX"):
+    """ Returns (solutions, number finished by propagation), a solution is False if there is none """
+    if not sudokus:
+        return [], 0
+    n = len(sudokus[0])
+    grids = toArray(sudokus)
+    valid = isValid(grids)
+    # a full grid without repetitions that kept the givens is the solution
+    finished = propagate(grids) & isValid(grids)
+    solutions = []
+    for k, grid in enumerate(grids):
+        if not valid[k]:
+            solutions.append(False)
+        elif finished[k]:
+            solutions.append(grid.reshape(n, n).tolist())
+        else:
+            # the singles only added numbers the solution has, so this is the same puzzle
+            solutions.append(solver.solve(grid.reshape(n, n).tolist(), method)[0])
+    return solutions, int(finished.sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve a puzzle file with vectorised constraint propagation")
+    parser.add_argument("file", nargs="?", default="sudokus.txt")
+    parser.add_argument("--size", type=int, default=9, help="board size, 9 or 16")
+    parser.add_argument("--method", choices=solver.Solver.methods, default="DLX", help="solver for the grids propagation leaves open")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="puzzles held in memory at once")
+    parser.add_argument("--output", default=None, help="file to write to instead of stdout")
+    parser.add_argument("--check", action="store_true", help="only compare the candidate masks with the normal solver")
+    args = parser.parse_args()
+
+    if args.check:
+        wrong = count = 0
+        for chunk in batch.chunks(puzzles.iterSudokus(args.file, args.size), args.chunk_size):
+            wrong += checkCandidates(chunk)
+            count += len(chunk)
+        print("%d wrong candidate masks in %d puzzles" % (wrong, count), file=sys.stderr)
+        sys.exit(1 if wrong else 0)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    count = solved = propagated = 0
+    start = time.perf_counter()
+    try:
+        for chunk in batch.chunks(puzzles.iterSudokus(args.file, args.size), args.chunk_size):
+            solutions, finished = solveAll(chunk, args.method)
+            for res in solutions:
+                out.write((puzzles.formatSudoku(res) if res else "none") + "\n")
+                solved += bool(res)
+            count += len(chunk)
+            propagated += finished
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print("solved %d/%d in %.3fs (%.0f puzzles/s), %d by propagation alone" % (
+        solved, count, elapsed, count/elapsed if elapsed else 0, propagated
+    ), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
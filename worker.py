@@ -0,0 +1,90 @@
+""" Runs a solve in a background thread, so the window stays responsive.
+
+The steps of the search reach the UI thread through a queue in batches,
+encoded like in solver.Trace. poll() is meant to be called once per frame.
+The solution cache is looked up and filled in the thread as well, as
+canonical() can take a while; the search runs either way, so the chosen
+method is always animated and a cached solution is only compared with it.
+"""
+import queue
+import threading
+import time
+from array import array
+
+import cache
+import solver
+
+
+class SolveWorker():
+    """ One solve of board with method, started right away, cacheFile=None uses no cache """
+    BATCH = 4096
+
+    def __init__(self, board, method, cacheFile=None):
+        self.size = len(board)
+        self.cacheFile = cacheFile
+        self.queue = queue.Queue()
+        self.solver = solver.Solver(self.observe)
+        self.buffer = array("H")
+        # set by poll() once the search is over
+        self.done = False
+        self.result = None
+        # the exception the search failed with
+        self.error = None
+        # the cached solution (None on a miss) and the cache statistics after the solve
+        self.cached = None
+        self.cacheStatistics = None
+        self.thread = threading.Thread(target=self.run, args=(board, method), daemon=True)
+        self.thread.start()
+
+    def observe(self, num, y, x):
+        self.buffer.append((y*self.size + x) << 5 | num)
+        if len(self.buffer) >= self.BATCH:
+            self.queue.put(self.buffer)
+            self.buffer = array("H")
+
+    def run(self, board, method):
+        error = None
+        solutions = cache.SolutionCache(self.cacheFile) if self.cacheFile else None
+        try:
+            if solutions:
+                self.cached = solutions.get(board)
+            res, stats = self.solver.solve(board, method)
+            if solutions and res and not self.cached:
+                solutions.put(board, res)
+        except solver.SearchAborted:
+            return
+        except Exception as e:
+            # poll() has to learn that the search is over either way
+            res, error = False, e
+        finally:
+            if solutions:
+                self.cacheStatistics = solutions.statistics()
+                solutions.close()
+        self.queue.put(self.buffer)
+        self.queue.put((res, error))
+
+    def poll(self, trace, timeout=0.005):
+        """ Moves the steps that arrived into trace, for at most about timeout seconds.
+        Returns True if something arrived. """
+        end = time.perf_counter() + timeout
+        arrived = False
+        while not self.done and time.perf_counter() < end:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            arrived = True
+            if isinstance(item, tuple):
+                self.done = True
+                self.result, self.error = item
+            else:
+                trace.extend(item)
+        return arrived
+
+    def wait(self):
+        """ Blocks until the search is over, its steps still have to be polled """
+        self.thread.join()
+
+    def cancel(self):
+        """ The search stops at its next node """
+        self.solver.budget = 0